@@ -11,15 +11,77 @@ class Settings(BaseSettings):
         default="postgresql+psycopg2://postgres:postgres@db:5432/ai_research",
         alias="DATABASE_URL",
     )
+    async_database_url: str | None = Field(default=None, alias="ASYNC_DATABASE_URL")
     jwt_secret: str = Field(default="dev_secret_change_me", alias="JWT_SECRET")
     jwt_algorithm: str = "HS256"
     jwt_exp_minutes: int = 60 * 24
+    auth_cache_ttl_seconds: float = Field(default=60.0, alias="AUTH_CACHE_TTL_SECONDS")
+    auth_cache_max_entries: int = Field(default=10000, alias="AUTH_CACHE_MAX_ENTRIES")
 
     openai_api_key: str | None = Field(default=None, alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4o-mini", alias="OPENAI_MODEL")
     openai_embedding_model: str = Field(
         default="text-embedding-3-small", alias="OPENAI_EMBEDDING_MODEL"
     )
+    openai_base_url: str | None = Field(default=None, alias="OPENAI_BASE_URL")
+    openai_timeout_seconds: float = Field(default=60.0, alias="OPENAI_TIMEOUT_SECONDS")
+    openai_connect_timeout_seconds: float = Field(default=5.0, alias="OPENAI_CONNECT_TIMEOUT_SECONDS")
+    openai_max_connections: int = Field(default=20, alias="OPENAI_MAX_CONNECTIONS")
+    openai_breaker_failures: int = Field(default=5, alias="OPENAI_BREAKER_FAILURES")
+    openai_breaker_reset_seconds: float = Field(default=30.0, alias="OPENAI_BREAKER_RESET_SECONDS")
+    llm_max_retries: int = Field(default=2, alias="LLM_MAX_RETRIES")
+
+    embedding_batch_max_items: int = Field(default=256, alias="EMBEDDING_BATCH_MAX_ITEMS")
+    embedding_batch_max_tokens: int = Field(default=200000, alias="EMBEDDING_BATCH_MAX_TOKENS")
+    embedding_concurrency: int = Field(default=4, alias="EMBEDDING_CONCURRENCY")
+    embedding_max_retries: int = Field(default=5, alias="EMBEDDING_MAX_RETRIES")
+
+    embedding_provider: str = Field(default="auto", alias="EMBEDDING_PROVIDER")
+    local_embedding_dims: int = Field(default=512, alias="LOCAL_EMBEDDING_DIMS")
+    embedding_cache_enabled: bool = Field(default=True, alias="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_max_entries: int = Field(default=10000, alias="EMBEDDING_CACHE_MAX_ENTRIES")
+
+    index_cache_max_bytes: int = Field(default=512 * 1024 * 1024, alias="INDEX_CACHE_MAX_BYTES")
+    index_cache_max_projects: int = Field(default=64, alias="INDEX_CACHE_MAX_PROJECTS")
+    ann_min_vectors: int = Field(default=0, alias="ANN_MIN_VECTORS")
+    ann_lists: int = Field(default=0, alias="ANN_LISTS")
+    ann_nprobe: int = Field(default=64, alias="ANN_NPROBE")
+    retrieval_mode: str = Field(default="auto", alias="RETRIEVAL_MODE")
+    retrieval_batch_size: int = Field(default=5000, alias="RETRIEVAL_BATCH_SIZE")
+    search_mode: str = Field(default="dense", alias="SEARCH_MODE")
+    search_candidates: int = Field(default=200, alias="SEARCH_CANDIDATES")
+    prompt_token_budget: int = Field(default=3000, alias="PROMPT_TOKEN_BUDGET")
+    tokenizer_load_timeout_seconds: float = Field(default=5.0, alias="TOKENIZER_LOAD_TIMEOUT_SECONDS")
+    prompt_mmr: bool = Field(default=False, alias="PROMPT_MMR")
+    prompt_mmr_lambda: float = Field(default=0.7, alias="PROMPT_MMR_LAMBDA")
+    answer_cache_enabled: bool = Field(default=True, alias="ANSWER_CACHE_ENABLED")
+    answer_cache_max_entries: int = Field(default=1000, alias="ANSWER_CACHE_MAX_ENTRIES")
+    answer_cache_ttl_seconds: float = Field(default=3600.0, alias="ANSWER_CACHE_TTL_SECONDS")
+    answer_cache_similarity: float = Field(default=0.0, alias="ANSWER_CACHE_SIMILARITY")
+    metrics_enabled: bool = Field(default=False, alias="METRICS_ENABLED")
+
+    ingestion_workers: int = Field(default=2, alias="INGESTION_WORKERS")
+    ingestion_max_attempts: int = Field(default=3, alias="INGESTION_MAX_ATTEMPTS")
+    ingestion_retry_base_seconds: float = Field(default=10.0, alias="INGESTION_RETRY_BASE_SECONDS")
+    ingestion_lease_seconds: int = Field(default=600, alias="INGESTION_LEASE_SECONDS")
+    ingestion_poll_seconds: float = Field(default=1.0, alias="INGESTION_POLL_SECONDS")
+    ingestion_batch_size: int = Field(default=256, alias="INGESTION_BATCH_SIZE")
+    pdf_parse_workers: int = Field(default=0, alias="PDF_PARSE_WORKERS")
+    chunk_write_method: str = Field(default="auto", alias="CHUNK_WRITE_METHOD")
+    chunk_insert_batch_size: int = Field(default=1000, alias="CHUNK_INSERT_BATCH_SIZE")
+    chunk_copy_min_rows: int = Field(default=200, alias="CHUNK_COPY_MIN_ROWS")
+    worker_metrics_port: int = Field(default=0, alias="WORKER_METRICS_PORT")
+
+    url_fetch_timeout: float = Field(default=15.0, alias="URL_FETCH_TIMEOUT")
+    url_max_bytes: int = Field(default=10 * 1024 * 1024, alias="URL_MAX_BYTES")
+    html_extraction_mode: str = Field(default="main", alias="HTML_EXTRACTION_MODE")
+    html_max_text_chars: int = Field(default=2_000_000, alias="HTML_MAX_TEXT_CHARS")
+    url_refresh_interval_seconds: int = Field(default=86400, alias="URL_REFRESH_INTERVAL_SECONDS")
+    url_refresh_batch_size: int = Field(default=1000, alias="URL_REFRESH_BATCH_SIZE")
+    crawl_concurrency: int = Field(default=32, alias="CRAWL_CONCURRENCY")
+    crawl_per_host_concurrency: int = Field(default=4, alias="CRAWL_PER_HOST_CONCURRENCY")
+    crawl_host_delay_seconds: float = Field(default=0.1, alias="CRAWL_HOST_DELAY_SECONDS")
+    crawl_max_pages: int = Field(default=5000, alias="CRAWL_MAX_PAGES")
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.db import Base, engine
+from app.db import Base, async_engine, engine, get_db
+from app.migrations import upgrade_schema, warn_stale_embeddings
 from app.routers import auth, chat, documents, projects
+from app.services.answer_cache import answer_cache
+from app.services.auth_cache import principal_cache, project_owner_cache
+from app.services.embedding_cache import embedding_cache
+from app.services.index_cache import index_cache
+from app.services.jobs import queue_stats
+from app.services.metrics import render
+from app.services.openai_clients import client_stats, close_clients
+from app.services.tokens import preload_tokenizer
 
 
 app = FastAPI(title=settings.app_name)
@@ -14,12 +25,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    warn_stale_embeddings(engine)
+    preload_tokenizer()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await close_clients()
+    await async_engine.dispose()
 
 
 @app.get("/health")
@@ -27,6 +48,46 @@ def health() -> dict:
     return {"status": "ok"}
 
 
+# Internal numbers and queue queries; served only where /metrics is enabled.
+@app.get("/stats")
+def stats(db: Session = Depends(get_db)) -> dict:
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "index_cache": index_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "auth_cache": {
+            "principals": principal_cache.stats(),
+            "project_owners": project_owner_cache.stats(),
+        },
+        "ingestion_queue": queue_stats(db),
+        "openai": client_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    embeddings = embedding_cache.stats()
+    answers = answer_cache.stats()
+    cache_stats = {
+        "embedding": {
+            "hits": embeddings["memory_hits"] + embeddings["db_hits"],
+            "misses": embeddings["misses"],
+            "entries": embeddings["entries"],
+        },
+        "answer": {
+            "hits": answers["hits"] + answers["similar_hits"],
+            "misses": answers["misses"],
+            "entries": answers["entries"],
+        },
+        "index": {"entries": index_cache.stats()["projects"]},
+        "principal": principal_cache.stats(),
+        "project_owner": project_owner_cache.stats(),
+    }
+    return PlainTextResponse(render(cache_stats, client_stats()), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(auth.router)
 app.include_router(projects.router)
 app.include_router(documents.router)
@@ -0,0 +1,142 @@
+import argparse
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.services.embedding_codec import encode_embedding
+from app.services.embeddings import embed_texts, embedding_model_name
+
+
+logger = logging.getLogger(__name__)
+
+# create_all() only creates missing tables, so columns added to existing
+# tables are applied here. Every statement must be idempotent.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE projects ADD COLUMN IF NOT EXISTS index_version INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_vector BYTEA",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_dim INTEGER",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(100)",
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_norm DOUBLE PRECISION",
+    "CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_claim ON ingestion_jobs (available_at, id) "
+    "WHERE status = 'queued'",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "ALTER TABLE projects ADD COLUMN IF NOT EXISTS index_epoch INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS last_fetched_at TIMESTAMP",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS kind VARCHAR(20) NOT NULL DEFAULT 'ingest'",
+    "ALTER TABLE ingestion_jobs ADD COLUMN IF NOT EXISTS progress JSONB",
+    "ALTER TABLE ingestion_jobs ALTER COLUMN document_id DROP NOT NULL",
+    # Rewrites document_chunks once to fill the column for existing rows.
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR "
+    "GENERATED ALWAYS AS (to_tsvector('english', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_tsv ON document_chunks "
+    "USING GIN (content_tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_project_created ON chat_messages "
+    "(project_id, created_at, id)",
+]
+
+
+def upgrade_schema(engine: Engine) -> None:
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+
+def migrate_jsonb_embeddings(engine: Engine, batch_size: int = 1000) -> int:
+    select_batch = text(
+        "SELECT id, embedding FROM document_chunks "
+        "WHERE embedding_vector IS NULL AND jsonb_typeof(embedding) = 'array' "
+        "ORDER BY id LIMIT :limit FOR UPDATE SKIP LOCKED"
+    )
+    update_row = text(
+        "UPDATE document_chunks SET embedding_vector = :embedding_vector, "
+        "embedding_dim = :embedding_dim, embedding_model = :embedding_model, "
+        "embedding_norm = :embedding_norm, embedding = NULL WHERE id = :id"
+    )
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {"limit": batch_size}).all()
+            if not rows:
+                break
+            # The producing model of legacy rows is unknown; it stays NULL.
+            params = [{"id": row.id, **encode_embedding(row.embedding, None)} for row in rows]
+            conn.execute(update_row, params)
+        converted += len(rows)
+        logger.info("Converted %s chunk embeddings", converted)
+    return converted
+
+
+# Chunks embedded by another model (e.g. hash-384 before the local hashing
+# embedder became the keyless default) are left out of retrieval. Rows
+# converted by migrate_jsonb_embeddings() have no model recorded and count too.
+def warn_stale_embeddings(engine: Engine) -> None:
+    model = embedding_model_name()
+    with engine.connect() as conn:
+        stale = conn.scalar(
+            text(
+                "SELECT COALESCE(embedding_model, 'an unknown model') FROM document_chunks "
+                "WHERE embedding_model IS DISTINCT FROM :model LIMIT 1"
+            ),
+            {"model": model},
+        )
+    if stale:
+        logger.warning(
+            "Some chunks were embedded with %s and may not be searchable with %s; re-embed them with "
+            "`python -m app.migrations --reembed` or set EMBEDDING_PROVIDER to match",
+            stale,
+            model,
+        )
+
+
+def reembed_chunks(engine: Engine, batch_size: int = 1000) -> int:
+    model = embedding_model_name()
+    select_batch = text(
+        "SELECT id, project_id, content FROM document_chunks "
+        "WHERE embedding_model IS DISTINCT FROM :model ORDER BY id LIMIT :limit FOR UPDATE SKIP LOCKED"
+    )
+    update_row = text(
+        "UPDATE document_chunks SET embedding_vector = :embedding_vector, "
+        "embedding_dim = :embedding_dim, embedding_model = :embedding_model, "
+        "embedding_norm = :embedding_norm, embedding = NULL WHERE id = :id"
+    )
+    # Vectors are replaced, so cached indexes must be rebuilt, not extended.
+    bump_projects = text(
+        "UPDATE projects SET index_version = index_version + 1, index_epoch = index_epoch + 1 "
+        "WHERE id = ANY(:ids)"
+    )
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {"model": model, "limit": batch_size}).all()
+            if not rows:
+                break
+            vectors = embed_texts([row.content for row in rows])
+            params = [{"id": row.id, **encode_embedding(vector, model)} for row, vector in zip(rows, vectors)]
+            conn.execute(update_row, params)
+            conn.execute(bump_projects, {"ids": sorted({row.project_id for row in rows})})
+        converted += len(rows)
+        logger.info("Re-embedded %s chunks with %s", converted, model)
+    return converted
+
+
+if __name__ == "__main__":
+    from app.db import engine
+
+    parser = argparse.ArgumentParser(description="Apply schema upgrades and data migrations.")
+    parser.add_argument("--embeddings", action="store_true", help="convert JSONB embeddings to float32")
+    parser.add_argument(
+        "--reembed", action="store_true", help="re-embed chunks embedded by another model"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    upgrade_schema(engine)
+    if args.embeddings:
+        total = migrate_jsonb_embeddings(engine, args.batch_size)
+        logger.info("Done, %s rows converted", total)
+    if args.reembed:
+        total = reembed_chunks(engine, args.batch_size)
+        logger.info("Done, %s chunks re-embedded", total)
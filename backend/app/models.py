@@ -1,12 +1,28 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Computed,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 
 from app.db import Base
 
 
+# Must match the generated column in app/migrations.py.
+TEXT_SEARCH_CONFIG = "english"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,6 +44,8 @@ class Project(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     last_activity_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    index_version = Column(Integer, default=0, server_default="0", nullable=False)
+    index_epoch = Column(Integer, default=0, server_default="0", nullable=False)
 
     user = relationship("User", back_populates="projects")
     documents = relationship("Document", back_populates="project")
@@ -45,6 +63,8 @@ class Document(Base):
     source_url = Column(Text, nullable=True)
     metadata_json = Column(JSONB, nullable=True)
     text_excerpt = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    last_fetched_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     project = relationship("Project", back_populates="documents")
@@ -53,20 +73,33 @@ class Document(Base):
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
+    __table_args__ = (
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+    )
 
     id = Column(Integer, primary_key=True)
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
     content = Column(Text, nullable=False)
     embedding = Column(JSONB, nullable=True)
+    embedding_vector = Column(LargeBinary, nullable=True)
+    embedding_dim = Column(Integer, nullable=True)
+    embedding_model = Column(String(100), nullable=True)
+    embedding_norm = Column(Float, nullable=True)
     page_number = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    content_tsv = deferred(
+        Column(TSVECTOR, Computed(f"to_tsvector('{TEXT_SEARCH_CONFIG}', content)", persisted=True))
+    )
 
     document = relationship("Document", back_populates="chunks")
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_project_created", "project_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
@@ -77,3 +110,34 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     project = relationship("Project", back_populates="chat_messages")
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    model = Column(String(100), primary_key=True)
+    text_hash = Column(String(64), primary_key=True)
+    embedding_vector = Column(LargeBinary, nullable=False)
+    embedding_dim = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    kind = Column(String(20), default="ingest", server_default="ingest", nullable=False)
+    status = Column(String(20), default="queued", nullable=False, index=True)
+    payload = Column(JSONB, nullable=True)
+    progress = Column(JSONB, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
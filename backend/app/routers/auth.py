@@ -1,27 +1,57 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import get_db
-from app.models import User
+from app.db import get_async_db, get_db
+from app.models import Project, User
 from app.schemas import TokenResponse, UserCreate, UserOut
 from app.security import create_access_token, get_password_hash, decode_token, verify_password
+from app.services.auth_cache import Principal, principal_cache, project_owner_cache
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> User:
-    email = decode_token(token)
-    if not email:
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    claims = decode_token(token)
+    if not claims:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
+    user_id = claims.get("uid")
+    principal = principal_cache.get(user_id) if user_id is not None else None
+    if principal is None:
+        # Tokens issued before the uid claim are still resolved by email.
+        if user_id is not None:
+            user = await db.scalar(select(User).where(User.id == user_id))
+        else:
+            user = await db.scalar(select(User).where(User.email == claims["sub"]))
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        principal = Principal(id=user.id, email=user.email, is_active=user.is_active)
+        principal_cache.put(user.id, principal)
+    if not principal.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
+    return principal
+
+
+async def get_project_id(
+    project_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_current_user),
+) -> int:
+    owner_id = project_owner_cache.get(project_id)
+    if owner_id is None:
+        owner_id = await db.scalar(select(Project.user_id).where(Project.id == project_id))
+        if owner_id is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        project_owner_cache.put(project_id, owner_id)
+    if owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project_id
 
 
 @router.post("/signup", response_model=UserOut)
@@ -40,5 +70,5 @@ def login(payload: UserCreate, db: Session = Depends(get_db)) -> TokenResponse:
     user = db.query(User).filter(User.email == payload.email).first()
     if not user or not verify_password(payload.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_access_token(user.email)
+    token = create_access_token(user.email, user.id)
     return TokenResponse(access_token=token, user_id=user.id, email=user.email)
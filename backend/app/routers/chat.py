@@ -1,70 +1,172 @@
+import base64
+import binascii
 import json
-import time
 from datetime import datetime
-from typing import Generator
+from typing import AsyncGenerator
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import AsyncSessionLocal, get_async_db
 from app.models import ChatMessage, Project
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_project_id
 from app.schemas import ChatMessageOut, ChatRequest, ChatResponse
-from app.services.rag import answer_question
+from app.services.auth_cache import Principal
+from app.services.metrics import collect_request_timings, server_timing
+from app.services.rag import (
+    answer_question_async,
+    prepare_answer_async,
+    record_exchange_async,
+    remember_answer,
+    stream_answer_async,
+)
 
 
 router = APIRouter(prefix="/projects/{project_id}/chat", tags=["chat"])
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Newest first on (project_id, created_at, id), so each page is an index range
+# scan that starts at the cursor no matter how long the history is.
+def history_statement(
+    project_id: int, before: tuple[datetime, int] | None, limit: int, include_sources: bool
+) -> Select:
+    columns = [ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at]
+    if include_sources:
+        columns.append(ChatMessage.sources_json)
+    stmt = select(*columns).where(ChatMessage.project_id == project_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(*before))
+    return stmt.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit)
+
 
 @router.get("", response_model=list[ChatMessageOut])
-def get_history(
-    project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def get_history(
+    response: Response,
+    project_id: int = Depends(get_project_id),
+    before: str | None = None,
+    limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    include_sources: bool = True,
+    db: AsyncSession = Depends(get_async_db),
 ) -> list[ChatMessageOut]:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.project_id == project_id)
-        .order_by(ChatMessage.created_at.asc())
-        .all()
-    )
-    return messages
+    cursor = decode_cursor(before) if before else None
+    rows = (await db.execute(history_statement(project_id, cursor, limit + 1, include_sources))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    # Pages are returned oldest first, like the full history used to be.
+    return [
+        ChatMessageOut(
+            id=row.id,
+            role=row.role,
+            content=row.content,
+            sources_json=row.sources_json if include_sources else None,
+            created_at=row.created_at,
+        )
+        for row in reversed(rows)
+    ]
 
 
 @router.post("", response_model=ChatResponse)
-def chat(
-    project_id: int, payload: ChatRequest, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def chat(
+    payload: ChatRequest,
+    response: Response,
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_current_user),
 ) -> ChatResponse:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    answer, citations, used_chunks = answer_question(db, project, user.id, payload.question)
+    timings = collect_request_timings()
+    project = await db.get(Project, project_id)
+    answer, context = await answer_question_async(
+        db, project, user.id, payload.question, payload.search_mode
+    )
     project.last_activity_at = datetime.utcnow()
-    db.commit()
-    return ChatResponse(answer=answer, citations=citations, used_chunks=used_chunks)
+    await db.commit()
+    if timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return ChatResponse(
+        answer=answer,
+        citations=context.citations,
+        used_chunks=context.used_chunks,
+        cached=context.cached,
+        prompt_tokens=context.prompt_tokens,
+    )
 
 
 @router.post("/stream")
-def chat_stream(
-    project_id: int, payload: ChatRequest, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def chat_stream(
+    payload: ChatRequest,
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
+    user: Principal = Depends(get_current_user),
 ) -> StreamingResponse:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    def event_stream() -> Generator[str, None, None]:
-        answer, citations, used_chunks = answer_question(db, project, user.id, payload.question)
-        project.last_activity_at = datetime.utcnow()
-        db.commit()
-        for token in answer.split(" "):
-            data = json.dumps({"type": "token", "value": token + " "})
-            yield f"data: {data}\n\n"
-            time.sleep(0.02)
-        final_payload = json.dumps(
-            {"type": "done", "citations": [c.dict() for c in citations], "used_chunks": used_chunks}
-        )
-        yield f"data: {final_payload}\n\n"
+    timings = collect_request_timings()
+    project = await db.get(Project, project_id)
+
+    # Retrieval runs before the response starts so its errors are still HTTP
+    # errors. Server-Timing can only cover these stages, not the LLM stream.
+    context, cached_answer = await prepare_answer_async(db, project, payload.question, payload.search_mode)
+    citations = [c.dict() for c in context.citations]
+    user_id = user.id
+
+    # get_async_db closes its session before the body runs, so the exchange is
+    # saved through a session of the stream's own.
+    async def event_stream() -> AsyncGenerator[str, None]:
+        async with AsyncSessionLocal() as stream_db:
+            sources_payload = json.dumps(
+                {
+                    "type": "sources",
+                    "citations": citations,
+                    "used_chunks": context.used_chunks,
+                    "prompt_tokens": context.prompt_tokens,
+                }
+            )
+            yield f"data: {sources_payload}\n\n"
+            if cached_answer is not None:
+                answer = cached_answer
+                data = json.dumps({"type": "token", "value": answer})
+                yield f"data: {data}\n\n"
+            else:
+                parts = []
+                async for token in stream_answer_async(context):
+                    parts.append(token)
+                    data = json.dumps({"type": "token", "value": token})
+                    yield f"data: {data}\n\n"
+                answer = "".join(parts).strip()
+                remember_answer(project, context, answer, payload.search_mode)
+            stream_project = await stream_db.merge(project, load=False)
+            if context.has_sources:
+                await record_exchange_async(stream_db, stream_project, user_id, context, answer)
+            stream_project.last_activity_at = datetime.utcnow()
+            await stream_db.commit()
+            final_payload = json.dumps(
+                {
+                    "type": "done",
+                    "citations": citations,
+                    "used_chunks": context.used_chunks,
+                    "cached": context.cached,
+                    "prompt_tokens": context.prompt_tokens,
+                }
+            )
+            yield f"data: {final_payload}\n\n"
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    headers = {"Server-Timing": server_timing(timings)} if timings else None
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
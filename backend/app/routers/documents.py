@@ -1,155 +1,149 @@
 from datetime import datetime
-from pathlib import Path
 
-import logging
-
-from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
-from sqlalchemy.orm import Session
-
-from app.db import SessionLocal, get_db
-from app.models import Document, DocumentChunk, Project
-from app.routers.auth import get_current_user
-from app.schemas import DocumentOut, DocumentTextResponse, IngestUrlRequest
-from app.services.ingestion import build_chunks, embed_chunks, parse_pdf, parse_text, parse_url
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_async_db
+from app.config import settings
+from app.models import Document, IngestionJob, Project
+from app.routers.auth import get_project_id
+from app.schemas import CrawlOut, CrawlRequest, DocumentOut, DocumentTextResponse, IngestUrlRequest
+from app.services.ingestion import find_reusable_document, reuse_document_chunks
+from app.services.jobs import enqueue_crawl, enqueue_ingestion, enqueue_refresh, pending_document_job
 from app.utils.files import save_upload
 
 
 router = APIRouter(prefix="/projects/{project_id}/documents", tags=["documents"])
-logger = logging.getLogger(__name__)
-
-
-def _persist_chunks(db: Session, project_id: int, document: Document, chunks: list[dict]) -> None:
-    for chunk in chunks:
-        db.add(
-            DocumentChunk(
-                document_id=document.id,
-                project_id=project_id,
-                content=chunk["content"],
-                embedding=chunk.get("embedding"),
-                page_number=chunk.get("page_number"),
-            )
-        )
-
-
-def _ingest_document(
-    project_id: int, document_id: int, source_path: Path | None, raw_text: str | None
-) -> None:
-    db = SessionLocal()
-    try:
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if not document:
-            return
-
-        if document.doc_type == "pdf" and source_path:
-            text, pages = parse_pdf(str(source_path))
-        elif document.doc_type == "text" and raw_text is not None:
-            text, pages = parse_text(raw_text)
-        elif document.doc_type == "url" and document.source_url:
-            text, pages = parse_url(document.source_url)
-        else:
-            document.status = "failed"
-            db.commit()
-            return
-
-        chunks = build_chunks(pages)
-        if not chunks:
-            document.text_excerpt = text[:5000]
-            document.metadata_json = {
-                "page_count": len(pages),
-                "error": "No extractable text found in this document.",
-            }
-            document.status = "failed"
-            db.commit()
-            return
-
-        chunks = embed_chunks(chunks)
-        _persist_chunks(db, project_id, document, chunks)
-        document.text_excerpt = text[:5000]
-        document.metadata_json = {"page_count": len(pages)}
-        document.status = "ready"
-        db.commit()
-    except Exception as exc:
-        if document:
-            document.status = "failed"
-            document.metadata_json = {"error": str(exc)}
-            db.commit()
-        logger.exception("Failed to ingest document %s", document_id)
-    finally:
-        db.close()
 
 
 @router.get("", response_model=list[DocumentOut])
-def list_documents(
-    project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def list_documents(
+    project_id: int = Depends(get_project_id), db: AsyncSession = Depends(get_async_db)
 ) -> list[DocumentOut]:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    return db.query(Document).filter(Document.project_id == project_id).order_by(Document.created_at.desc()).all()
+    documents = await db.scalars(
+        select(Document).where(Document.project_id == project_id).order_by(Document.created_at.desc())
+    )
+    return documents.all()
 
 
 @router.post("/upload", response_model=DocumentOut)
-def upload_document(
-    project_id: int,
-    background_tasks: BackgroundTasks,
+async def upload_document(
+    project_id: int = Depends(get_project_id),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ) -> DocumentOut:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
     ext = (file.filename or "").lower().split(".")[-1]
     if ext not in {"pdf", "txt"}:
         raise HTTPException(status_code=400, detail="Unsupported file type")
     doc_type = "pdf" if ext == "pdf" else "text"
-    document = Document(project_id=project_id, name=file.filename or "document", doc_type=doc_type)
+    source_path, content_hash = await run_in_threadpool(
+        save_upload, file.file, file.filename or f"document.{ext}"
+    )
+    document = Document(
+        project_id=project_id,
+        name=file.filename or "document",
+        doc_type=doc_type,
+        content_hash=content_hash,
+    )
     db.add(document)
-    db.commit()
-    db.refresh(document)
-
-    source_path = save_upload(file.file, file.filename or f"document_{document.id}.{ext}")
-    raw_text = None
-    if doc_type == "text":
-        raw_text = source_path.read_text(encoding="utf-8", errors="ignore")
-    background_tasks.add_task(_ingest_document, project_id, document.id, source_path, raw_text)
-    project.last_activity_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await db.refresh(document)
+
+    source = await db.run_sync(lambda session: find_reusable_document(session, document))
+    if source is not None:
+        await db.run_sync(lambda session: reuse_document_chunks(session, document, source))
+    else:
+        enqueue_ingestion(db, document, source_path)
+    await db.execute(
+        update(Project).where(Project.id == project_id).values(last_activity_at=datetime.utcnow())
+    )
+    await db.commit()
     return document
 
 
 @router.post("/url", response_model=DocumentOut)
-def ingest_url(
-    project_id: int,
+async def ingest_url(
     payload: IngestUrlRequest,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
 ) -> DocumentOut:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
     document = Document(
         project_id=project_id, name=payload.url, doc_type="url", source_url=payload.url
     )
     db.add(document)
-    db.commit()
-    db.refresh(document)
-    background_tasks.add_task(_ingest_document, project_id, document.id, None, None)
-    project.last_activity_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    await db.refresh(document)
+    enqueue_ingestion(db, document)
+    await db.execute(
+        update(Project).where(Project.id == project_id).values(last_activity_at=datetime.utcnow())
+    )
+    await db.commit()
+    return document
+
+
+@router.post("/crawl", response_model=CrawlOut)
+async def crawl_urls(
+    payload: CrawlRequest,
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
+) -> CrawlOut:
+    if not payload.urls and not payload.sitemap_url:
+        raise HTTPException(status_code=400, detail="Provide urls or a sitemap_url")
+    max_pages = min(payload.max_pages or settings.crawl_max_pages, settings.crawl_max_pages)
+    job = enqueue_crawl(db, project_id, payload.urls[:max_pages], payload.sitemap_url, max_pages)
+    await db.execute(
+        update(Project).where(Project.id == project_id).values(last_activity_at=datetime.utcnow())
+    )
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+@router.get("/crawls", response_model=list[CrawlOut])
+async def list_crawls(
+    project_id: int = Depends(get_project_id), db: AsyncSession = Depends(get_async_db)
+) -> list[CrawlOut]:
+    jobs = await db.scalars(
+        select(IngestionJob)
+        .where(IngestionJob.project_id == project_id, IngestionJob.kind == "crawl")
+        .order_by(IngestionJob.created_at.desc())
+    )
+    return jobs.all()
+
+
+@router.post("/{document_id}/refresh", response_model=DocumentOut)
+async def refresh_url_document(
+    document_id: int,
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
+) -> DocumentOut:
+    # The row lock serializes concurrent refresh requests for the document.
+    document = await db.scalar(
+        select(Document)
+        .where(Document.id == document_id, Document.project_id == project_id)
+        .with_for_update()
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.doc_type != "url":
+        raise HTTPException(status_code=400, detail="Only URL documents can be refreshed")
+    if await db.scalar(select(pending_document_job(document.id))):
+        raise HTTPException(status_code=409, detail="Document is already being fetched")
+    enqueue_refresh(db, document)
+    await db.commit()
     return document
 
 
 @router.get("/{document_id}/text", response_model=DocumentTextResponse)
-def get_document_text(
-    project_id: int, document_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def get_document_text(
+    document_id: int,
+    project_id: int = Depends(get_project_id),
+    db: AsyncSession = Depends(get_async_db),
 ) -> DocumentTextResponse:
-    document = (
-        db.query(Document)
-        .join(Project, Project.id == Document.project_id)
-        .filter(Project.user_id == user.id, Document.id == document_id, Document.project_id == project_id)
-        .first()
+    document = await db.scalar(
+        select(Document).where(Document.id == document_id, Document.project_id == project_id)
     )
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -1,12 +1,12 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db import get_db
+from app.db import get_async_db
 from app.models import Document, Project
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_project_id
 from app.schemas import ProjectCreate, ProjectOut
 
 
@@ -14,13 +14,13 @@ router = APIRouter(prefix="/projects", tags=["projects"])
 
 
 @router.post("", response_model=ProjectOut)
-def create_project(
-    payload: ProjectCreate, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def create_project(
+    payload: ProjectCreate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)
 ) -> ProjectOut:
     project = Project(user_id=user.id, name=payload.name, description=payload.description)
     db.add(project)
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    await db.refresh(project)
     return ProjectOut(
         id=project.id,
         name=project.name,
@@ -32,14 +32,15 @@ def create_project(
 
 
 @router.get("", response_model=list[ProjectOut])
-def list_projects(db: Session = Depends(get_db), user=Depends(get_current_user)) -> list[ProjectOut]:
-    projects = (
-        db.query(Project, func.count(Document.id))
+async def list_projects(
+    db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)
+) -> list[ProjectOut]:
+    projects = await db.execute(
+        select(Project, func.count(Document.id))
         .outerjoin(Document, Document.project_id == Project.id)
-        .filter(Project.user_id == user.id)
+        .where(Project.user_id == user.id)
         .group_by(Project.id)
         .order_by(Project.last_activity_at.desc())
-        .all()
     )
     response = []
     for project, count in projects:
@@ -57,13 +58,13 @@ def list_projects(db: Session = Depends(get_db), user=Depends(get_current_user))
 
 
 @router.get("/{project_id}", response_model=ProjectOut)
-def get_project(
-    project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def get_project(
+    project_id: int = Depends(get_project_id), db: AsyncSession = Depends(get_async_db)
 ) -> ProjectOut:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    count = db.query(Document).filter(Document.project_id == project.id).count()
+    project = await db.get(Project, project_id)
+    count = await db.scalar(
+        select(func.count(Document.id)).where(Document.project_id == project.id)
+    )
     return ProjectOut(
         id=project.id,
         name=project.name,
@@ -75,12 +76,11 @@ def get_project(
 
 
 @router.post("/{project_id}/touch")
-def touch_project(
-    project_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)
+async def touch_project(
+    project_id: int = Depends(get_project_id), db: AsyncSession = Depends(get_async_db)
 ) -> dict:
-    project = db.query(Project).filter(Project.id == project_id, Project.user_id == user.id).first()
-    if not project:
-        raise HTTPException(status_code=404, detail="Project not found")
-    project.last_activity_at = datetime.utcnow()
-    db.commit()
+    await db.execute(
+        update(Project).where(Project.id == project_id).values(last_activity_at=datetime.utcnow())
+    )
+    await db.commit()
     return {"status": "ok"}
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, List, Optional
+from typing import Any, List, Literal, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -58,6 +58,7 @@ class DocumentOut(BaseModel):
 
 class ChatRequest(BaseModel):
     question: str
+    search_mode: Optional[Literal["dense", "prefilter", "hybrid"]] = None
 
 
 class Citation(BaseModel):
@@ -71,6 +72,8 @@ class ChatResponse(BaseModel):
     answer: str
     citations: List[Citation]
     used_chunks: Optional[List[dict]] = None
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
 
 
 class ChatMessageOut(BaseModel):
@@ -92,3 +95,21 @@ class DocumentTextResponse(BaseModel):
 
 class IngestUrlRequest(BaseModel):
     url: str
+
+
+class CrawlRequest(BaseModel):
+    urls: List[str] = Field(default_factory=list)
+    sitemap_url: Optional[str] = None
+    max_pages: Optional[int] = Field(default=None, ge=1)
+
+
+class CrawlOut(BaseModel):
+    id: int
+    status: str
+    progress: Optional[dict]
+    last_error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
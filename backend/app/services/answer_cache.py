@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_codec import EMBEDDING_DTYPE
+
+
+# (project id, project index version, search mode). Bumping the index version
+# on every chunk change is what invalidates a project's answers.
+Scope = Tuple[int, int, str]
+
+
+def normalize_question(question: str) -> str:
+    text = " ".join(unicodedata.normalize("NFC", question).casefold().split())
+    return text.rstrip(" ?!.")
+
+
+@dataclass
+class _Entry:
+    scope: Scope
+    value: Any
+    embedding: np.ndarray | None
+    expires_at: float
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._entries: OrderedDict[Tuple[Scope, str], _Entry] = OrderedDict()
+        self._projects: Dict[int, Set[Tuple[Scope, str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.answer_cache_enabled and self.max_entries > 0
+
+    def get(self, scope: Scope, question: str) -> Any | None:
+        if not self.enabled:
+            return None
+        key = (scope, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                if self.similarity <= 0:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    # Near-duplicate tier: the closest live answer in the same scope whose
+    # question embedding has at least `similarity` cosine similarity.
+    def get_similar(self, scope: Scope, embedding: List[float]) -> Any | None:
+        if not self.enabled or self.similarity <= 0:
+            return None
+        query = _unit(embedding)
+        now = time.monotonic()
+        best_key, best_score = None, self.similarity
+        with self._lock:
+            for key in list(self._projects.get(scope[0], ())):
+                entry = self._entries[key]
+                if entry.expires_at <= now:
+                    self._discard(key)
+                    continue
+                if entry.scope != scope or entry.embedding is None or len(entry.embedding) != len(query):
+                    continue
+                score = float(entry.embedding @ query)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key].value
+
+    def put(self, scope: Scope, question: str, embedding: List[float] | None, value: Any) -> None:
+        if not self.enabled:
+            return
+        key = (scope, normalize_question(question))
+        entry = _Entry(
+            scope=scope,
+            value=value,
+            embedding=_unit(embedding) if embedding is not None else None,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        with self._lock:
+            # Answers from older index versions can never be hit again.
+            for stale in [k for k in self._projects.get(scope[0], ()) if k[0][1] != scope[1]]:
+                self._discard(stale)
+            self._discard(key)
+            self._entries[key] = entry
+            self._projects.setdefault(scope[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+            }
+
+    def _discard(self, key: Tuple[Scope, str]) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        keys = self._projects.get(key[0][0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._projects[key[0][0]]
+
+
+def _unit(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    return vector / (np.linalg.norm(vector) + 1e-8)
+
+
+answer_cache = AnswerCache(
+    settings.answer_cache_max_entries,
+    settings.answer_cache_ttl_seconds,
+    settings.answer_cache_similarity,
+)
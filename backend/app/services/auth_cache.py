@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.models import User
+
+
+# Request-scoped user identity. Unlike a User row it isn't bound to a session,
+# so it can be shared between requests.
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    is_active: bool
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+principal_cache = TTLCache(settings.auth_cache_ttl_seconds, settings.auth_cache_max_entries)
+# Project id -> owner id. Projects never change owner, so entries only expire.
+project_owner_cache = TTLCache(settings.auth_cache_ttl_seconds, settings.auth_cache_max_entries)
+
+
+# Deactivating a user through the ORM revokes their cached principal in this
+# process immediately; other processes pick it up within the TTL.
+@event.listens_for(User.is_active, "set")
+def _revoke_principal(target: User, value: bool, oldvalue: Any, initiator: Any) -> None:
+    if target.id is not None and value != oldvalue:
+        principal_cache.discard(target.id)
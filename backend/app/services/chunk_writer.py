@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import io
+import struct
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import DocumentChunk
+from app.services.embedding_codec import encode_embedding
+
+
+# Binary COPY framing: signature, flags and header-extension length.
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+PG_EPOCH = datetime(2000, 1, 1)
+
+# Column -> binary COPY wire type.
+CHUNK_COLUMNS = {
+    "document_id": "int4",
+    "project_id": "int4",
+    "content": "text",
+    "page_number": "int4",
+    "embedding_vector": "bytea",
+    "embedding_dim": "int4",
+    "embedding_model": "text",
+    "embedding_norm": "float8",
+    "created_at": "timestamp",
+}
+
+
+def chunk_rows(project_id: int, document_id: int, chunks: List[dict]) -> List[dict]:
+    now = datetime.utcnow()
+    rows = []
+    for chunk in chunks:
+        vector = chunk.get("embedding")
+        row = {
+            "document_id": document_id,
+            "project_id": project_id,
+            "content": chunk["content"],
+            "page_number": chunk.get("page_number"),
+            "embedding_vector": None,
+            "embedding_dim": None,
+            "embedding_model": None,
+            "embedding_norm": None,
+            "created_at": now,
+        }
+        if vector is not None:
+            row.update(encode_embedding(vector, chunk.get("embedding_model")))
+        rows.append(row)
+    return rows
+
+
+def insert_chunk_rows(db: Session, rows: List[dict]) -> None:
+    batch_size = settings.chunk_insert_batch_size
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(DocumentChunk), rows[start : start + batch_size])
+
+
+def _binary_field(value, kind: str) -> bytes:
+    if value is None:
+        return struct.pack("!i", -1)
+    if kind == "int4":
+        return struct.pack("!ii", 4, value)
+    if kind == "float8":
+        return struct.pack("!id", 8, value)
+    if kind == "timestamp":
+        delta = value - PG_EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+        return struct.pack("!iq", 8, micros)
+    data = value.encode("utf-8") if kind == "text" else value
+    return struct.pack("!i", len(data)) + data
+
+
+def copy_chunk_rows(db: Session, rows: List[dict]) -> None:
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    field_count = struct.pack("!h", len(CHUNK_COLUMNS))
+    for row in rows:
+        buffer.write(field_count)
+        for column, kind in CHUNK_COLUMNS.items():
+            buffer.write(_binary_field(row[column], kind))
+    buffer.write(COPY_TRAILER)
+    buffer.seek(0)
+    # COPY runs on the session's own connection, so it shares its transaction.
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY document_chunks ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _use_copy(db: Session, row_count: int) -> bool:
+    method = settings.chunk_write_method
+    if method == "auto":
+        return db.get_bind().dialect.driver == "psycopg2" and row_count >= settings.chunk_copy_min_rows
+    return method == "copy"
+
+
+def write_chunks(db: Session, project_id: int, document_id: int, chunks: List[dict]) -> None:
+    rows = chunk_rows(project_id, document_id, chunks)
+    if _use_copy(db, len(rows)):
+        copy_chunk_rows(db, rows)
+    else:
+        insert_chunk_rows(db, rows)
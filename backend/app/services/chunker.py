@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+from app.services.tokens import CHARS_PER_TOKEN
+
+
+# Sizes are in characters at CHARS_PER_TOKEN, so chunking needs no tokenizer;
+# prompt packing does the exact count.
+CHUNK_TOKENS = 200
+CHUNK_SIZE = CHUNK_TOKENS * CHARS_PER_TOKEN
+# Whole trailing sentences up to this size are repeated at the next chunk's start.
+CHUNK_OVERLAP = 120
+# Page tails shorter than this continue into the next page's first chunk.
+MIN_CHUNK_CHARS = 200
+
+# Segment ends: after sentence punctuation (captured, with closing quotes, so
+# it stays with its sentence), at blank lines, and before markdown heading
+# lines (html_text keeps headings as "# Title" lines).
+SEGMENT_BREAK = re.compile(r"(?=[.!?\n])(?:([.!?][\"')\]]*)\s+|\n\s*\n|\n(?=#{1,6} ))")
+HEADING = re.compile(r"#{1,6} ")
+
+
+class _Segment:
+    __slots__ = ("text", "page_number", "heading")
+
+    def __init__(self, text: str, page_number: int, heading: bool) -> None:
+        self.text = text
+        self.page_number = page_number
+        self.heading = heading
+
+
+# Segments are sliced straight out of the page text; nothing is normalized
+# at page level.
+def _segments(page_number: int, text: str) -> Iterator[_Segment]:
+    start = 0
+    for match in SEGMENT_BREAK.finditer(text):
+        end = match.end(1) if match.lastindex else match.start()
+        if end - start <= CHUNK_SIZE and text[start] != "#":
+            piece = " ".join(text[start:end].split())
+            if piece:
+                yield _Segment(piece, page_number, False)
+        else:
+            yield from _split_segment(page_number, text, start, end)
+        start = match.end()
+    yield from _split_segment(page_number, text, start, len(text))
+
+
+def _split_segment(page_number: int, text: str, start: int, end: int) -> Iterator[_Segment]:
+    if HEADING.match(text, start) is not None:
+        # A heading is its own segment; the rest of its line is body text.
+        newline = text.find("\n", start, end)
+        yield from _pieces(page_number, text, start, end if newline < 0 else newline, True)
+        if newline < 0:
+            return
+        start = newline + 1
+    yield from _pieces(page_number, text, start, end, False)
+
+
+# Text longer than a chunk is cut at the last space before the limit; only the
+# first piece of a heading stays a heading.
+def _pieces(page_number: int, text: str, start: int, end: int, heading: bool) -> Iterator[_Segment]:
+    while end - start > CHUNK_SIZE:
+        cut = text.rfind(" ", start, start + CHUNK_SIZE)
+        cut = cut if cut > start else start + CHUNK_SIZE
+        piece = " ".join(text[start:cut].split())
+        if piece:
+            yield _Segment(piece, page_number, heading)
+            heading = False
+        start = cut
+    piece = " ".join(text[start:end].split())
+    if piece:
+        yield _Segment(piece, page_number, heading)
+
+
+def _join(segments: List[_Segment]) -> str:
+    parts = []
+    for idx, segment in enumerate(segments):
+        if idx:
+            parts.append("\n" if segment.heading or segments[idx - 1].heading else " ")
+        parts.append(segment.text)
+    return "".join(parts)
+
+
+def _size(segments: List[_Segment]) -> int:
+    return sum(len(segment.text) + 1 for segment in segments)
+
+
+def _overlap(segments: List[_Segment]) -> List[_Segment]:
+    kept: List[_Segment] = []
+    size = 0
+    for segment in reversed(segments):
+        if segment.heading or size + len(segment.text) > CHUNK_OVERLAP:
+            break
+        kept.insert(0, segment)
+        size += len(segment.text) + 1
+    return kept
+
+
+def _last_body(segments: List[_Segment]) -> int:
+    for idx in range(len(segments) - 1, -1, -1):
+        if not segments[idx].heading:
+            return idx
+    return -1
+
+
+def _cut(segment: _Segment, limit: int) -> Tuple[_Segment, _Segment]:
+    cut = segment.text.rfind(" ", 0, limit)
+    cut = cut if cut > 0 else limit
+    head = _Segment(segment.text[:cut].rstrip(), segment.page_number, False)
+    return head, _Segment(segment.text[cut:].lstrip(), segment.page_number, False)
+
+
+# Yields {"content", "page_number"} chunks from (page_number, text) pages.
+# Chunks end at sentence or heading boundaries, a heading starts a new chunk
+# once the current one is big enough, and page_number is where a chunk starts.
+def chunk_pages(pages: Iterable[Tuple[int, str]], merge_tails: bool = True) -> Iterator[dict]:
+    carried: List[_Segment] = []  # overlap repeated from the previous chunk
+    current: List[_Segment] = []
+    carried_size = current_size = 0
+
+    def flush() -> dict:
+        segments = carried + current
+        return {"content": _join(segments), "page_number": segments[0].page_number}
+
+    for page_number, text in pages:
+        for segment in _segments(page_number, text or ""):
+            over = carried_size + current_size + len(segment.text) > CHUNK_SIZE
+            new_section = segment.heading and current_size >= MIN_CHUNK_CHARS
+            body = _last_body(current) if new_section or over else -1
+            if body >= 0:
+                # Headings belong with the text after them, not at a chunk's end.
+                headings = current[body + 1 :]
+                del current[body + 1 :]
+                yield flush()
+                carried = [] if new_section or headings else _overlap(carried + current)
+                current = headings
+                carried_size, current_size = _size(carried), _size(current)
+            elif over and segment.heading and current:
+                # A run of headings with no text (e.g. "#" comment lines) fills a chunk.
+                yield flush()
+                carried, current = [], []
+                carried_size = current_size = 0
+            if carried and carried_size + current_size + len(segment.text) > CHUNK_SIZE:
+                carried, carried_size = [], 0
+            if current and not segment.heading and current_size + len(segment.text) > CHUNK_SIZE:
+                # Only headings are left; cut the segment so they keep some text.
+                room = CHUNK_SIZE - current_size
+                if room > 0:
+                    head, segment = _cut(segment, room)
+                    current.append(head)
+                yield flush()
+                current, current_size = [], 0
+            current.append(segment)
+            current_size += len(segment.text) + 1
+        if current and not (merge_tails and current_size < MIN_CHUNK_CHARS):
+            yield flush()
+            current, current_size = [], 0
+        if not current:
+            carried, carried_size = [], 0
+    if current:
+        yield flush()
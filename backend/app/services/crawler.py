@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import xml.etree.ElementTree as ElementTree
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Document, DocumentChunk, IngestionJob
+from app.services.chunk_writer import write_chunks
+from app.services.index_cache import bump_index_version
+from app.services.ingestion import EXCERPT_CHARS, FetchedPage, build_chunks, embed_chunks, html_to_text
+from app.services.jobs import PermanentJobError, pending_document_job
+
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_MAX_DEPTH = 3
+
+
+class CrawlResult(NamedTuple):
+    url: str
+    page: FetchedPage | None
+    error: str | None
+
+
+class HostLimiter:
+    # Caps concurrent requests per host and spaces request starts by `delay`.
+    def __init__(self, per_host: int, delay: float) -> None:
+        self.delay = delay
+        self._slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self._next_start: Dict[str, float] = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = urlsplit(url).netloc
+        async with self._slots[host]:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+async def fetch_page(client: httpx.AsyncClient, url: str, max_bytes: int) -> FetchedPage:
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        if int(response.headers.get("content-length") or 0) > max_bytes:
+            raise PermanentJobError(f"Page is larger than {max_bytes} bytes")
+        body = bytearray()
+        async for block in response.aiter_bytes():
+            body += block
+            if len(body) > max_bytes:
+                raise PermanentJobError(f"Page is larger than {max_bytes} bytes")
+        html = bytes(body).decode(response.encoding or "utf-8", errors="replace")
+        return FetchedPage(html, response.headers.get("etag"), response.headers.get("last-modified"))
+
+
+async def sitemap_urls(
+    client: httpx.AsyncClient, sitemap_url: str, limit: int, depth: int = 0
+) -> List[str]:
+    page = await fetch_page(client, sitemap_url, settings.url_max_bytes)
+    root = ElementTree.fromstring(page.html.encode("utf-8"))
+    locations = [
+        element.text.strip()
+        for element in root.iter()
+        if element.tag.rsplit("}", 1)[-1] == "loc" and element.text
+    ]
+    if root.tag.rsplit("}", 1)[-1] != "sitemapindex":
+        return locations[:limit]
+    urls: List[str] = []
+    if depth < SITEMAP_MAX_DEPTH:
+        for child in locations:
+            if len(urls) >= limit:
+                break
+            urls.extend(await sitemap_urls(client, child, limit - len(urls), depth + 1))
+    return urls
+
+
+async def crawl(
+    urls: Iterable[str],
+    on_result: Callable[[CrawlResult], Awaitable[None]],
+    client: httpx.AsyncClient,
+    concurrency: int | None = None,
+    per_host: int | None = None,
+    host_delay: float | None = None,
+    max_bytes: int | None = None,
+) -> None:
+    limiter = HostLimiter(
+        per_host or settings.crawl_per_host_concurrency,
+        settings.crawl_host_delay_seconds if host_delay is None else host_delay,
+    )
+    max_bytes = max_bytes or settings.url_max_bytes
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    async def fetcher() -> None:
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                async with limiter.slot(url):
+                    page = await fetch_page(client, url, max_bytes)
+                result = CrawlResult(url, page, None)
+            except Exception as exc:
+                result = CrawlResult(url, None, str(exc) or exc.__class__.__name__)
+            await on_result(result)
+
+    workers = min(concurrency or settings.crawl_concurrency, queue.qsize())
+    await asyncio.gather(*(fetcher() for _ in range(workers)))
+
+
+class CrawlPipeline:
+    # Collects fetched pages into shared chunk batches so a crawl embeds and
+    # writes INGESTION_BATCH_SIZE chunks at a time regardless of page size.
+    def __init__(self, job_id: int, project_id: int, document_ids: Dict[str, int], total: int) -> None:
+        self.job_id = job_id
+        self.project_id = project_id
+        self.document_ids = document_ids
+        self.progress = {"stage": "crawling", "pages": total, "fetched": 0, "ready": 0, "failed": 0, "chunks": 0}
+        self._chunks: List[dict] = []
+        self._pages: Dict[int, dict] = {}
+        self._lock = asyncio.Lock()
+
+    async def add(self, result: CrawlResult) -> None:
+        document_id = self.document_ids[result.url]
+        if result.page is None:
+            self._pages[document_id] = {"error": result.error}
+        else:
+            self.progress["fetched"] += 1
+            # Parsing a large page would stall every fetcher on the event loop.
+            text, chunks = await asyncio.to_thread(_extract, result.page.html)
+            for chunk in chunks:
+                chunk["document_id"] = document_id
+            self._chunks.extend(chunks)
+            self._pages[document_id] = {"page": result.page, "text": text, "chunk_count": len(chunks)}
+        if len(self._chunks) >= settings.ingestion_batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            chunks, self._chunks = self._chunks, []
+            pages, self._pages = self._pages, {}
+            if chunks or pages:
+                await asyncio.to_thread(self._write, chunks, pages)
+
+    def _write(self, chunks: List[dict], pages: Dict[int, dict]) -> None:
+        embedded = embed_chunks(chunks) if chunks else []
+        by_document = defaultdict(list)
+        for chunk in embedded:
+            by_document[chunk.pop("document_id")].append(chunk)
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            for document_id, document_chunks in by_document.items():
+                write_chunks(db, self.project_id, document_id, document_chunks)
+            for document_id, info in pages.items():
+                document = db.get(Document, document_id)
+                if "error" in info or not info["chunk_count"]:
+                    document.status = "failed"
+                    document.metadata_json = {
+                        "error": info.get("error") or "No extractable text found in this document."
+                    }
+                    self.progress["failed"] += 1
+                    continue
+                page = info["page"]
+                document.text_excerpt = info["text"][:EXCERPT_CHARS]
+                document.metadata_json = {
+                    "page_count": 1,
+                    "chunk_count": info["chunk_count"],
+                    "http": {"etag": page.etag, "last_modified": page.last_modified},
+                }
+                document.last_fetched_at = now
+                document.status = "ready"
+                self.progress["ready"] += 1
+            self.progress["chunks"] += len(embedded)
+            if embedded:
+                bump_index_version(db, self.project_id)
+            _set_progress(db, self.job_id, self.progress)
+            db.commit()
+
+
+def _extract(html: str) -> tuple[str, List[dict]]:
+    text = html_to_text(html)
+    return text, build_chunks([(1, text)])
+
+
+def _set_progress(db: Session, job_id: int, progress: dict) -> None:
+    db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(progress=dict(progress)))
+
+
+def _prepare_documents(job: IngestionJob, urls: List[str]) -> Dict[str, int]:
+    with SessionLocal() as db:
+        existing = {
+            document.source_url: document
+            for document in db.scalars(
+                select(Document).where(
+                    Document.project_id == job.project_id,
+                    Document.doc_type == "url",
+                    Document.source_url.in_(urls),
+                )
+            )
+        }
+        # Documents another job is writing right now are left to it: their
+        # ingest or refresh job is pending, or another running crawl owns them.
+        other_crawls = set(
+            db.scalars(
+                select(IngestionJob.id).where(
+                    IngestionJob.kind == "crawl",
+                    IngestionJob.status.in_(("queued", "running")),
+                    IngestionJob.id != job.id,
+                )
+            )
+        )
+        busy = set(
+            db.scalars(
+                select(Document.id).where(
+                    Document.id.in_([doc.id for doc in existing.values()]), pending_document_job()
+                )
+            )
+        )
+        busy.update(
+            doc.id
+            for doc in existing.values()
+            if ((doc.metadata_json or {}).get("progress") or {}).get("crawl_job") in other_crawls
+        )
+        # Chunks left by an interrupted attempt are discarded and refetched.
+        unfinished = [doc.id for doc in existing.values() if doc.status != "ready" and doc.id not in busy]
+        if unfinished:
+            db.execute(delete(DocumentChunk).where(DocumentChunk.document_id.in_(unfinished)))
+            bump_index_version(db, job.project_id, removed=True)
+        documents = {}
+        for url in urls:
+            document = existing.get(url)
+            if document is not None and (document.status == "ready" or document.id in busy):
+                continue
+            if document is None:
+                document = Document(project_id=job.project_id, name=url[:255], doc_type="url", source_url=url)
+                db.add(document)
+            document.status = "processing"
+            document.metadata_json = {"progress": {"stage": "crawling", "crawl_job": job.id}}
+            documents[url] = document
+        _set_progress(db, job.id, {"stage": "crawling", "pages": len(documents)})
+        db.commit()
+        return {url: document.id for url, document in documents.items()}
+
+
+async def _run_crawl(job: IngestionJob) -> None:
+    payload = job.payload or {}
+    limit = min(payload.get("max_pages") or settings.crawl_max_pages, settings.crawl_max_pages)
+    async with httpx.AsyncClient(
+        timeout=settings.url_fetch_timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=settings.crawl_concurrency),
+    ) as client:
+        urls = list(payload.get("urls") or [])
+        if payload.get("sitemap_url"):
+            urls.extend(await sitemap_urls(client, payload["sitemap_url"], limit))
+        urls = list(dict.fromkeys(url for url in urls if url.startswith(("http://", "https://"))))[:limit]
+        document_ids = await asyncio.to_thread(_prepare_documents, job, urls)
+        pipeline = CrawlPipeline(job.id, job.project_id, document_ids, len(document_ids))
+        await crawl(document_ids, pipeline.add, client)
+        await pipeline.flush()
+    pipeline.progress["stage"] = "done"
+    with SessionLocal() as db:
+        _set_progress(db, job.id, pipeline.progress)
+        db.commit()
+    logger.info("Crawl job %s finished: %s", job.id, pipeline.progress)
+
+
+def run_crawl_job(db: Session, job_id: int) -> None:
+    job = db.get(IngestionJob, job_id)
+    db.expunge(job)
+    asyncio.run(_run_crawl(job))
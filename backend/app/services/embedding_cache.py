@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config import settings
+from app.db import AsyncSessionLocal, SessionLocal
+from app.models import EmbeddingCacheEntry
+from app.services.embedding_codec import EMBEDDING_DTYPE, decode_embedding
+
+
+logger = logging.getLogger(__name__)
+
+DB_LOOKUP_BATCH = 1000
+
+
+def text_hash(text: str) -> str:
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _lookup_statements(model: str, hashes: List[str]) -> list:
+    return [
+        select(
+            EmbeddingCacheEntry.text_hash,
+            EmbeddingCacheEntry.embedding_vector,
+            EmbeddingCacheEntry.embedding_dim,
+        ).where(
+            EmbeddingCacheEntry.model == model,
+            EmbeddingCacheEntry.text_hash.in_(hashes[start : start + DB_LOOKUP_BATCH]),
+        )
+        for start in range(0, len(hashes), DB_LOOKUP_BATCH)
+    ]
+
+
+def _store_rows(model: str, vectors: Dict[str, List[float]]) -> List[dict]:
+    rows = []
+    for h, vector in vectors.items():
+        array = np.asarray(vector, dtype=EMBEDDING_DTYPE)
+        rows.append(
+            {
+                "model": model,
+                "text_hash": h,
+                "embedding_vector": array.tobytes(),
+                "embedding_dim": int(array.size),
+            }
+        )
+    return rows
+
+
+def _as_list(vector: np.ndarray | Sequence[float]) -> List[float]:
+    return vector.tolist() if isinstance(vector, np.ndarray) else list(vector)
+
+
+# Vectors are held as float32 arrays (6 KB at 1536 dims rather than ~50 KB as
+# a list of Python floats) and converted to lists on the way out.
+class EmbeddingCache:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            }
+
+    def embed(
+        self,
+        model: str,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], Sequence[Sequence[float]]],
+        persist: bool = True,
+    ) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self._memory_lookup(model, hashes)
+        memory_hits = len(found)
+
+        pending = {h: text for h, text in zip(hashes, texts) if h not in found}
+        if persist and pending:
+            found.update(self._db_lookup(model, list(pending)))
+            for h in found:
+                pending.pop(h, None)
+        db_hits = len(found) - memory_hits
+
+        if pending:
+            computed = dict(zip(pending, compute(list(pending.values()))))
+            found.update(computed)
+            if persist:
+                self._db_store(model, computed)
+
+        self._finish(model, found, memory_hits, db_hits, len(pending))
+        return [_as_list(found[h]) for h in hashes]
+
+    async def embed_async(
+        self,
+        model: str,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], Awaitable[Sequence[Sequence[float]]]],
+        persist: bool = True,
+    ) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self._memory_lookup(model, hashes)
+        memory_hits = len(found)
+
+        pending = {h: text for h, text in zip(hashes, texts) if h not in found}
+        if persist and pending:
+            found.update(await self._db_lookup_async(model, list(pending)))
+            for h in found:
+                pending.pop(h, None)
+        db_hits = len(found) - memory_hits
+
+        if pending:
+            computed = dict(zip(pending, await compute(list(pending.values()))))
+            found.update(computed)
+            if persist:
+                await self._db_store_async(model, computed)
+
+        self._finish(model, found, memory_hits, db_hits, len(pending))
+        return [_as_list(found[h]) for h in hashes]
+
+    def _finish(self, model: str, found: dict, memory_hits: int, db_hits: int, misses: int) -> None:
+        self._memory_store(model, found)
+        with self._lock:
+            self.memory_hits += memory_hits
+            self.db_hits += db_hits
+            self.misses += misses
+
+    def _memory_lookup(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for h in hashes:
+                vector = self._entries.get((model, h))
+                if vector is not None:
+                    self._entries.move_to_end((model, h))
+                    found[h] = vector
+        return found
+
+    def _memory_store(self, model: str, vectors: Dict[str, np.ndarray | Sequence[float]]) -> None:
+        arrays = {h: np.asarray(vector, dtype=EMBEDDING_DTYPE) for h, vector in vectors.items()}
+        with self._lock:
+            for h, array in arrays.items():
+                previous = self._entries.pop((model, h), None)
+                if previous is not None:
+                    self._bytes -= previous.nbytes
+                self._entries[(model, h)] = array
+                self._bytes += array.nbytes
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    # The table tier is an optimisation; failures fall through to the provider.
+    def _db_lookup(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        try:
+            with SessionLocal() as db:
+                for stmt in _lookup_statements(model, hashes):
+                    for h, blob, dim in db.execute(stmt):
+                        found[h] = decode_embedding(blob, dim)
+        except Exception:
+            logger.warning("Embedding cache lookup failed", exc_info=True)
+        return found
+
+    async def _db_lookup_async(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        try:
+            async with AsyncSessionLocal() as db:
+                for stmt in _lookup_statements(model, hashes):
+                    for h, blob, dim in await db.execute(stmt):
+                        found[h] = decode_embedding(blob, dim)
+        except Exception:
+            logger.warning("Embedding cache lookup failed", exc_info=True)
+        return found
+
+    def _db_store(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        try:
+            with SessionLocal() as db:
+                db.execute(insert(EmbeddingCacheEntry).on_conflict_do_nothing(), _store_rows(model, vectors))
+                db.commit()
+        except Exception:
+            logger.warning("Embedding cache store failed", exc_info=True)
+
+    async def _db_store_async(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    insert(EmbeddingCacheEntry).on_conflict_do_nothing(), _store_rows(model, vectors)
+                )
+                await db.commit()
+        except Exception:
+            logger.warning("Embedding cache store failed", exc_info=True)
+
+
+embedding_cache = EmbeddingCache(settings.embedding_cache_max_entries)
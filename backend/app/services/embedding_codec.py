@@ -0,0 +1,32 @@
+from typing import Sequence
+
+import numpy as np
+
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def encode_embedding(vector: Sequence[float], model: str | None) -> dict:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec = vec / norm
+    return {
+        "embedding_vector": vec.astype(EMBEDDING_DTYPE).tobytes(),
+        "embedding_dim": int(vec.size),
+        "embedding_model": model,
+        "embedding_norm": norm,
+    }
+
+
+def decode_embedding(blob: bytes, dim: int) -> np.ndarray:
+    vec = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+    if vec.size != dim:
+        raise ValueError(f"Embedding has {vec.size} values, expected {dim}")
+    return vec
+
+
+def decode_matrix(blobs: Sequence[bytes], dim: int) -> np.ndarray:
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype=EMBEDDING_DTYPE).reshape(len(blobs), dim)
@@ -1,10 +1,25 @@
+import asyncio
 import hashlib
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Protocol, Sequence, Tuple
 
 import numpy as np
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 from app.config import settings
+from app.services.embedding_cache import embedding_cache
+from app.services.local_embeddings import HashingEmbedder
+from app.services.openai_clients import (
+    async_openai_client,
+    call_with_retries,
+    call_with_retries_async,
+    embedding_breaker,
+    openai_client,
+)
+
+
+HASH_EMBEDDING_MODEL = "hash-384"
+
 
 def _hash_embedding(text: str, dims: int = 384) -> List[float]:
     digest = hashlib.sha256(text.encode("utf-8")).digest()
@@ -15,14 +30,159 @@ def _hash_embedding(text: str, dims: int = 384) -> List[float]:
     return vec.astype(float).tolist()
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def plan_batches(texts: List[str], max_items: int, max_tokens: int) -> List[Tuple[int, int]]:
+    batches = []
+    start = 0
+    tokens = 0
+    for idx, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if idx > start and (idx - start >= max_items or tokens + cost > max_tokens):
+            batches.append((start, idx))
+            start, tokens = idx, 0
+        tokens += cost
+    batches.append((start, len(texts)))
+    return batches
+
+
+def _request_embeddings(client: OpenAI, texts: List[str]) -> List[List[float]]:
+    response = call_with_retries(
+        embedding_breaker,
+        lambda: client.embeddings.create(model=settings.openai_embedding_model, input=texts),
+        settings.embedding_max_retries,
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+async def _request_embeddings_async(client: AsyncOpenAI, texts: List[str]) -> List[List[float]]:
+    response = await call_with_retries_async(
+        embedding_breaker,
+        lambda: client.embeddings.create(model=settings.openai_embedding_model, input=texts),
+        settings.embedding_max_retries,
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def _openai_embeddings(texts: List[str]) -> List[List[float]]:
+    client = openai_client()
+    batches = plan_batches(
+        texts, settings.embedding_batch_max_items, settings.embedding_batch_max_tokens
+    )
+    if len(batches) == 1:
+        return _request_embeddings(client, texts)
+    workers = min(settings.embedding_concurrency, len(batches))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda span: _request_embeddings(client, texts[span[0] : span[1]]), batches
+        )
+        return [vector for batch in results for vector in batch]
+
+
+async def _openai_embeddings_async(texts: List[str]) -> List[List[float]]:
+    batches = plan_batches(
+        texts, settings.embedding_batch_max_items, settings.embedding_batch_max_tokens
+    )
+    semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+    client = async_openai_client()
+
+    async def run(span: Tuple[int, int]) -> List[List[float]]:
+        async with semaphore:
+            return await _request_embeddings_async(client, texts[span[0] : span[1]])
+
+    results = await asyncio.gather(*(run(span) for span in batches))
+    return [vector for batch in results for vector in batch]
+
+
+class EmbeddingProvider(Protocol):
+    model_name: str
+    persist_cache: bool
+
+    def embed(self, texts: Sequence[str]) -> Sequence[Sequence[float]]:
+        ...
+
+
+class OpenAIEmbeddingProvider:
+    persist_cache = True
+
+    @property
+    def model_name(self) -> str:
+        return settings.openai_embedding_model
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return _openai_embeddings(list(texts))
+
+    async def embed_async(self, texts: Sequence[str]) -> List[List[float]]:
+        return await _openai_embeddings_async(list(texts))
+
+
+# Seeded random vectors, kept so chunks embedded before the hashing embedder
+# existed stay searchable when EMBEDDING_PROVIDER=hash.
+class LegacyHashEmbeddingProvider:
+    model_name = HASH_EMBEDDING_MODEL
+    persist_cache = False
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return [_hash_embedding(text) for text in texts]
+
+
+EMBEDDING_PROVIDERS: dict[str, EmbeddingProvider] = {
+    "openai": OpenAIEmbeddingProvider(),
+    "local": HashingEmbedder(settings.local_embedding_dims),
+    "hash": LegacyHashEmbeddingProvider(),
+}
+
+
+def register_embedding_provider(name: str, provider: EmbeddingProvider) -> None:
+    EMBEDDING_PROVIDERS[name] = provider
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    name = settings.embedding_provider
+    if name == "auto":
+        name = "openai" if settings.openai_api_key else "local"
+    provider = EMBEDDING_PROVIDERS.get(name)
+    if provider is None:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    return provider
+
+
+def embedding_model_name() -> str:
+    return get_embedding_provider().model_name
+
+
+def embed_texts(texts: List[str], use_cache: bool = True) -> List[List[float]]:
+    if not texts:
+        return []
+    provider = get_embedding_provider()
+    if use_cache and settings.embedding_cache_enabled:
+        return embedding_cache.embed(
+            provider.model_name, texts, provider.embed, persist=provider.persist_cache
+        )
+    return list(provider.embed(texts))
+
+
+def _async_compute(provider: EmbeddingProvider) -> Callable[[List[str]], Awaitable]:
+    embed_async = getattr(provider, "embed_async", None)
+    if embed_async is not None:
+        return embed_async
+
+    # Local providers are CPU-bound; keep them off the event loop.
+    async def compute(texts: List[str]) -> Sequence[Sequence[float]]:
+        return await asyncio.to_thread(provider.embed, texts)
+
+    return compute
+
+
+async def embed_texts_async(texts: List[str], use_cache: bool = True) -> List[List[float]]:
     if not texts:
         return []
-    if settings.openai_api_key:
-        client = OpenAI(api_key=settings.openai_api_key)
-        response = client.embeddings.create(
-            model=settings.openai_embedding_model,
-            input=texts,
+    provider = get_embedding_provider()
+    compute = _async_compute(provider)
+    if use_cache and settings.embedding_cache_enabled:
+        return await embedding_cache.embed_async(
+            provider.model_name, texts, compute, persist=provider.persist_cache
         )
-        return [item.embedding for item in response.data]
-    return [_hash_embedding(text) for text in texts]
+    return list(await compute(texts))
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from app.config import settings
+
+
+DROP_TAGS = ("script", "style", "noscript", "template", "svg", "iframe", "canvas", "head")
+# Page chrome; header/footer inside an article usually hold its title or byline.
+BOILERPLATE_XPATH = (
+    "//nav | //aside | //form | //menu | //dialog"
+    " | //header[not(ancestor::article or ancestor::main)]"
+    " | //footer[not(ancestor::article or ancestor::main)]"
+)
+BOILERPLATE_ROLES = "navigation", "banner", "contentinfo", "complementary", "search"
+KEEP_TAGS = ("html", "body", "main", "article")
+# Whole class/id tokens only: "has-sidebar" or "toc-and-content" often wrap
+# the content itself.
+BOILERPLATE_TOKENS = frozenset(
+    "nav navbar menu footer sidebar breadcrumb breadcrumbs cookie cookies banner advert ads "
+    "share social related comment comments subscribe newsletter skip-link toc".split()
+)
+# Chrome-looking elements holding more than this share of the page text are kept.
+MAX_BOILERPLATE_SHARE = 0.5
+BLOCK_TAGS = (
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table",
+    "tr", "th", "td", "pre", "blockquote", "figure", "figcaption", "address", "body",
+)
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+# Main content shorter than this share of the page text is treated as a bad pick.
+MIN_MAIN_SHARE = 0.25
+BLOCK_BREAK = "\n\n"
+
+
+def _parse(markup: str) -> etree._Element | None:
+    if not markup.strip():
+        return None
+    parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True)
+    try:
+        return lxml_html.fromstring(markup.encode("utf-8"), parser=parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _remove(element: etree._Element) -> None:
+    # drop_tree keeps the tail text, which belongs to the parent.
+    if element.getparent() is not None:
+        element.drop_tree()
+
+
+def _text_length(element: etree._Element) -> int:
+    return sum(len(part.strip()) for part in element.itertext())
+
+
+def _is_boilerplate(element: etree._Element) -> bool:
+    if element.tag in KEEP_TAGS:
+        return False
+    if element.get("role") in BOILERPLATE_ROLES:
+        return True
+    marker = f"{element.get('id', '')} {element.get('class', '')}".lower().split()
+    return not BOILERPLATE_TOKENS.isdisjoint(marker)
+
+
+# Never drops an element wrapping the main content (e.g. a page-wide <form>)
+# or most of the page's text.
+def _strip_boilerplate(root: etree._Element) -> None:
+    page_length = _text_length(root)
+    candidates = root.xpath(BOILERPLATE_XPATH)
+    candidates += [element for element in root.xpath("//*[@id or @class or @role]") if _is_boilerplate(element)]
+    for element in candidates:
+        if element.xpath("boolean(.//main | .//article | .//*[@role='main'])"):
+            continue
+        if _text_length(element) > MAX_BOILERPLATE_SHARE * page_length:
+            continue
+        _remove(element)
+
+
+def _main_container(root: etree._Element) -> etree._Element:
+    body = root.find("body")
+    body = body if body is not None else root
+    candidates = root.xpath("//main | //*[@role='main'] | //article")
+    if not candidates:
+        return body
+    best = max(candidates, key=_text_length)
+    if _text_length(best) < MIN_MAIN_SHARE * _text_length(body):
+        return body
+    return best
+
+
+def _mark_blocks(container: etree._Element) -> None:
+    for element in container.iter(*HEADING_TAGS):
+        level = int(element.tag[1])
+        element.text = f"{BLOCK_BREAK}{'#' * level} {element.text or ''}"
+        element.tail = BLOCK_BREAK + (element.tail or "")
+    for element in container.iter(*BLOCK_TAGS):
+        element.text = BLOCK_BREAK + (element.text or "")
+        element.tail = BLOCK_BREAK + (element.tail or "")
+    for element in container.iter("br"):
+        element.tail = "\n" + (element.tail or "")
+
+
+def _normalize(text: str, max_chars: int) -> str:
+    blocks = []
+    size = 0
+    for block in text.split(BLOCK_BREAK):
+        block = " ".join(block.split())
+        if not block or block.strip("#") == "":
+            continue
+        blocks.append(block)
+        size += len(block) + len(BLOCK_BREAK)
+        if size >= max_chars:
+            break
+    return BLOCK_BREAK.join(blocks)[:max_chars]
+
+
+# Blocks are separated by blank lines and headings keep a markdown "#" prefix
+# so the chunker can follow the page structure.
+def extract_text(markup: str, main_content: bool | None = None, max_chars: int | None = None) -> str:
+    main_content = settings.html_extraction_mode == "main" if main_content is None else main_content
+    max_chars = max_chars or settings.html_max_text_chars
+    root = _parse(markup[: settings.url_max_bytes])
+    if root is None:
+        return ""
+    etree.strip_elements(root, *DROP_TAGS, with_tail=False)
+    if main_content:
+        _strip_boilerplate(root)
+        container = _main_container(root)
+    else:
+        container = root
+    _mark_blocks(container)
+    return _normalize("".join(container.itertext()), max_chars)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import DocumentChunk, Project
+from app.services.embedding_codec import decode_matrix, encode_embedding
+from app.services.embeddings import embedding_model_name
+from app.services.metrics import RAG_STAGE_SECONDS, timer
+from app.services.vector_store import IVFIndex, search
+
+
+@dataclass
+class ProjectIndex:
+    project_id: int
+    version: int
+    matrix: np.ndarray
+    chunk_ids: np.ndarray
+    document_ids: np.ndarray
+    ann: IVFIndex | None = None
+    epoch: int = 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        ann_bytes = self.ann.nbytes if self.ann is not None else 0
+        return self.matrix.nbytes + self.chunk_ids.nbytes + self.document_ids.nbytes + ann_bytes
+
+    def search(self, query: List[float], k: int, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        if self.ann is None:
+            return search(self.matrix, query, k)
+        return self.ann.search(self.matrix, query, k, nprobe or settings.ann_nprobe)
+
+
+class ProjectIndexCache:
+    def __init__(self, max_bytes: int, max_projects: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_projects = max_projects
+        self._entries: OrderedDict[int, ProjectIndex] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, project_id: int) -> ProjectIndex | None:
+        with self._lock:
+            index = self._entries.get(project_id)
+            if index is not None:
+                self._entries.move_to_end(project_id)
+            return index
+
+    def put(self, index: ProjectIndex) -> None:
+        if index.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(index.project_id)
+            self._entries[index.project_id] = index
+            self._bytes += index.nbytes
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_projects:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, project_id: int) -> None:
+        with self._lock:
+            self._discard(project_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"projects": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _discard(self, project_id: int) -> None:
+        index = self._entries.pop(project_id, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+
+
+index_cache = ProjectIndexCache(settings.index_cache_max_bytes, settings.index_cache_max_projects)
+
+
+# Pass removed=True when chunks were deleted or replaced: cached indexes can
+# then no longer be extended with just the chunks they are missing.
+def bump_index_version(db: Session, project_id: int, removed: bool = False) -> None:
+    values = {"index_version": Project.index_version + 1}
+    if removed:
+        values["index_epoch"] = Project.index_epoch + 1
+    db.execute(update(Project).where(Project.id == project_id).values(**values))
+
+
+def vector_filters(project_id: int) -> list:
+    return [
+        DocumentChunk.project_id == project_id,
+        DocumentChunk.embedding_vector.isnot(None),
+        or_(
+            DocumentChunk.embedding_model == embedding_model_name(),
+            DocumentChunk.embedding_model.is_(None),
+        ),
+    ]
+
+
+# Rows not yet converted by migrate_jsonb_embeddings().
+def legacy_vector_filters(project_id: int) -> list:
+    return [
+        DocumentChunk.project_id == project_id,
+        DocumentChunk.embedding_vector.is_(None),
+        func.jsonb_typeof(DocumentChunk.embedding) == "array",
+    ]
+
+
+def _fetch_vector_rows(db: Session, project_id: int, after_chunk_id: int = 0) -> list[tuple]:
+    rows = (
+        db.query(
+            DocumentChunk.id,
+            DocumentChunk.document_id,
+            DocumentChunk.embedding_vector,
+            DocumentChunk.embedding_dim,
+            DocumentChunk.embedding_model,
+        )
+        .filter(*vector_filters(project_id), DocumentChunk.id > after_chunk_id)
+        .all()
+    )
+    legacy_rows = (
+        db.query(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.embedding)
+        .filter(*legacy_vector_filters(project_id), DocumentChunk.id > after_chunk_id)
+        .all()
+    )
+    rows = [tuple(row) for row in rows]
+    for chunk_id, document_id, embedding in legacy_rows:
+        encoded = encode_embedding(embedding, None)
+        rows.append(
+            (chunk_id, document_id, encoded["embedding_vector"], encoded["embedding_dim"], None)
+        )
+    return sorted(rows, key=lambda row: row[0])
+
+
+# Chunk ids commit out of order (concurrent ingest transactions), so the rows
+# an index lacks are found by id, not as the rows past its last chunk id.
+def _missing_chunk_ids(db: Session, index: ProjectIndex) -> np.ndarray:
+    ids = [
+        row[0]
+        for row in db.query(DocumentChunk.id).filter(
+            *vector_filters(index.project_id), DocumentChunk.embedding_dim == index.dim
+        )
+    ]
+    ids.extend(row[0] for row in db.query(DocumentChunk.id).filter(*legacy_vector_filters(index.project_id)))
+    return np.setdiff1d(np.asarray(ids, dtype=np.int64), index.chunk_ids)
+
+
+# ANN_MIN_VECTORS=0 (the default) keeps every project on exact search.
+def _train_ann(matrix: np.ndarray) -> IVFIndex | None:
+    if not settings.ann_min_vectors or len(matrix) < settings.ann_min_vectors:
+        return None
+    return IVFIndex.train(matrix, n_lists=settings.ann_lists)
+
+
+def build_project_index(db: Session, project_id: int, version: int, epoch: int = 0) -> ProjectIndex:
+    rows = _fetch_vector_rows(db, project_id)
+    if not rows:
+        return ProjectIndex(
+            project_id=project_id,
+            version=version,
+            matrix=np.empty((0, 0), dtype=np.float32),
+            chunk_ids=np.empty(0, dtype=np.int64),
+            document_ids=np.empty(0, dtype=np.int64),
+            epoch=epoch,
+        )
+    # Chunks embedded by a different model cannot be compared in one matrix;
+    # rows of unknown provenance only decide the width when nothing else does.
+    model = embedding_model_name()
+    dims = Counter(row[3] for row in rows if row[4] == model) or Counter(row[3] for row in rows)
+    dim = dims.most_common(1)[0][0]
+    rows = [row for row in rows if row[3] == dim]
+    matrix = decode_matrix([row[2] for row in rows], dim)
+    return ProjectIndex(
+        project_id=project_id,
+        version=version,
+        matrix=matrix,
+        chunk_ids=np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+        document_ids=np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+        ann=_train_ann(matrix),
+        epoch=epoch,
+    )
+
+
+def extend_project_index(db: Session, index: ProjectIndex, version: int) -> ProjectIndex:
+    missing = _missing_chunk_ids(db, index)
+    rows = []
+    if len(missing):
+        rows = _fetch_vector_rows(db, index.project_id, after_chunk_id=int(missing[0]) - 1)
+        wanted = set(missing.tolist())
+        rows = [row for row in rows if row[0] in wanted and row[3] == index.dim]
+    if not rows:
+        return ProjectIndex(
+            index.project_id,
+            version,
+            index.matrix,
+            index.chunk_ids,
+            index.document_ids,
+            index.ann,
+            index.epoch,
+        )
+    vectors = decode_matrix([row[2] for row in rows], index.dim)
+    matrix = np.concatenate((index.matrix, vectors))
+    new_chunk_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    new_document_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    chunk_ids = np.concatenate((index.chunk_ids, new_chunk_ids))
+    document_ids = np.concatenate((index.document_ids, new_document_ids))
+    # Lists drift as the corpus grows, so retrain once it has doubled.
+    if index.ann is None or len(matrix) > 2 * index.ann.trained_size:
+        ann = _train_ann(matrix)
+    else:
+        positions = np.arange(len(index.matrix), len(matrix), dtype=np.int64)
+        ann = index.ann.extended(positions, vectors)
+    return ProjectIndex(index.project_id, version, matrix, chunk_ids, document_ids, ann, index.epoch)
+
+
+def get_project_index(db: Session, project: Project) -> ProjectIndex:
+    index = index_cache.get(project.id)
+    if index is not None and index.version == project.index_version:
+        return index
+    # Within an epoch chunks are only appended, so a stale index can be brought
+    # up to date by adding the chunks it is missing.
+    with timer(RAG_STAGE_SECONDS, "index_load"):
+        if index is not None and len(index) and index.epoch == project.index_epoch:
+            index = extend_project_index(db, index, project.index_version)
+        else:
+            index = build_project_index(db, project.id, project.index_version, project.index_epoch)
+    index_cache.put(index)
+    return index
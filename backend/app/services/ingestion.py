@@ -1,73 +1,354 @@
 from __future__ import annotations
 
-from typing import List, Tuple
+import hashlib
+import os
+from collections import defaultdict, deque
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
 
 import requests
-from bs4 import BeautifulSoup
 from pypdf import PdfReader
+from requests.adapters import HTTPAdapter
+from sqlalchemy import delete, exists, insert, literal, select, update
+from sqlalchemy.orm import Session
 
-from app.services.embeddings import embed_texts
+from app.config import settings
+from app.db import SessionLocal
+from app.models import Document, DocumentChunk, Project
+from app.services.chunk_writer import write_chunks
+from app.services.chunker import chunk_pages
+from app.services.embeddings import embed_texts, embedding_model_name
+from app.services.html_text import extract_text
+from app.services.index_cache import bump_index_version
+from app.services.jobs import PermanentJobError
+from app.services.metrics import INGESTION_STAGE_SECONDS, stage_clock
 
 
-CHUNK_SIZE = 800
-CHUNK_OVERLAP = 120
+PDF_PAGES_PER_TASK = 16
+EXCERPT_CHARS = 5000
+REUSED_CHUNK_COLUMNS = (
+    "content",
+    "page_number",
+    "embedding_vector",
+    "embedding_dim",
+    "embedding_model",
+    "embedding_norm",
+)
 
 
-def _chunk_text(text: str) -> List[str]:
-    text = " ".join(text.split())
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + CHUNK_SIZE, len(text))
-        chunks.append(text[start:end])
-        start = end - CHUNK_OVERLAP
-        if start < 0:
-            start = 0
-        if end == len(text):
-            break
-    return [chunk for chunk in chunks if chunk.strip()]
+def _extract_pages(path: str, start: int, stop: int) -> List[str]:
+    reader = PdfReader(path)
+    return [reader.pages[idx].extract_text() or "" for idx in range(start, stop)]
 
 
-def parse_pdf(path: str) -> Tuple[str, List[Tuple[int, str]]]:
-    reader = PdfReader(path)
-    pages = []
-    for idx, page in enumerate(reader.pages, start=1):
-        content = page.extract_text() or ""
-        pages.append((idx, content))
-    full_text = "\n".join(page[1] for page in pages)
-    return full_text, pages
+def iter_pdf_pages(path: str, workers: int | None = None) -> Iterator[Tuple[int, str]]:
+    page_count = len(PdfReader(path).pages)
+    spans = [
+        (start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    workers = min(workers or settings.pdf_parse_workers or os.cpu_count() or 1, len(spans))
+    if workers <= 1:
+        for start, stop in spans:
+            for offset, content in enumerate(_extract_pages(path, start, stop)):
+                yield start + offset + 1, content
+        return
+
+    # Only a window of page ranges is in flight, so memory stays bounded by the
+    # window while pages are still yielded in document order.
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        remaining = iter(spans)
+        pending = deque(
+            (start, pool.submit(_extract_pages, path, start, stop))
+            for start, stop in islice(remaining, workers * 2)
+        )
+        while pending:
+            start, future = pending.popleft()
+            for span in islice(remaining, 1):
+                pending.append((span[0], pool.submit(_extract_pages, path, *span)))
+            for offset, content in enumerate(future.result()):
+                yield start + offset + 1, content
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def parse_text(text: str) -> Tuple[str, List[Tuple[int, str]]]:
     return text, [(1, text)]
 
 
-def parse_url(url: str) -> Tuple[str, List[Tuple[int, str]]]:
-    response = requests.get(url, timeout=15)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    text = soup.get_text(" ", strip=True)
-    return text, [(1, text)]
+class FetchedPage(NamedTuple):
+    html: str
+    etag: str | None
+    last_modified: str | None
+
+
+_http_session: requests.Session | None = None
+
+
+def http_session() -> requests.Session:
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+        _http_session.mount("http://", adapter)
+        _http_session.mount("https://", adapter)
+    return _http_session
+
+
+# Returns None when the server answers 304 to the conditional headers.
+def fetch_url(
+    url: str, etag: str | None = None, last_modified: str | None = None
+) -> FetchedPage | None:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    with http_session().get(
+        url, headers=headers, timeout=settings.url_fetch_timeout, stream=True
+    ) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        declared = int(response.headers.get("content-length") or 0)
+        if declared > settings.url_max_bytes:
+            raise PermanentJobError(f"Page is larger than {settings.url_max_bytes} bytes")
+        body = bytearray()
+        for block in response.iter_content(64 * 1024):
+            body += block
+            if len(body) > settings.url_max_bytes:
+                raise PermanentJobError(f"Page is larger than {settings.url_max_bytes} bytes")
+        html = bytes(body).decode(response.encoding or "utf-8", errors="replace")
+        return FetchedPage(html, response.headers.get("etag"), response.headers.get("last-modified"))
+
+
+def html_to_text(html: str) -> str:
+    return extract_text(html)
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]]) -> Iterator[dict]:
+    return chunk_pages(pages)
 
 
 def build_chunks(pages: List[Tuple[int, str]]) -> List[dict]:
-    chunk_payloads = []
-    for page_number, page_text in pages:
-        for chunk in _chunk_text(page_text):
-            chunk_payloads.append(
-                {
-                    "content": chunk,
-                    "page_number": page_number,
-                }
-            )
-    return chunk_payloads
+    return list(iter_chunks(pages))
 
 
 def embed_chunks(chunks: List[dict]) -> List[dict]:
     texts = [chunk["content"] for chunk in chunks]
     embeddings = embed_texts(texts)
+    model = embedding_model_name()
     for chunk, vector in zip(chunks, embeddings):
         chunk["embedding"] = vector
+        chunk["embedding_model"] = model
     return chunks
+
+
+# Progress goes through its own short transaction so the chunks flushed by the
+# ingest transaction stay invisible until the document is complete.
+def report_progress(document_id: int, stage: str, **counts: int) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            update(Document)
+            .where(Document.id == document_id)
+            .values(metadata_json={"progress": {"stage": stage, **counts}})
+        )
+        db.commit()
+
+
+def _iter_document_pages(document: Document, source_path: str | None) -> Iterator[Tuple[int, str]] | None:
+    if document.doc_type == "pdf" and source_path:
+        return iter_pdf_pages(source_path)
+    if document.doc_type == "text" and source_path:
+        return iter(parse_text(Path(source_path).read_text(encoding="utf-8", errors="ignore"))[1])
+    return None
+
+
+def _observe_pages(pages: Iterable[Tuple[int, str]], summary: dict) -> Iterator[Tuple[int, str]]:
+    for page in pages:
+        summary["pages"] += 1
+        if len(summary["excerpt"]) < EXCERPT_CHARS:
+            summary["excerpt"] = (summary["excerpt"] + "\n" + page[1]).lstrip("\n")[:EXCERPT_CHARS]
+        yield page
+
+
+# Only the uploader's own documents are reused: matches across users would
+# reveal that someone else holds the same file.
+def find_reusable_document(db: Session, document: Document) -> Document | None:
+    if not document.content_hash:
+        return None
+    owner = select(Project.user_id).where(Project.id == document.project_id).scalar_subquery()
+    owned_projects = select(Project.id).where(Project.user_id == owner)
+    return db.scalar(
+        select(Document)
+        .where(
+            Document.content_hash == document.content_hash,
+            Document.doc_type == document.doc_type,
+            Document.status == "ready",
+            Document.id != document.id,
+            Document.project_id.in_(owned_projects),
+            exists().where(
+                DocumentChunk.document_id == Document.id,
+                DocumentChunk.embedding_model == embedding_model_name(),
+            ),
+        )
+        .order_by(Document.id.desc())
+        .limit(1)
+    )
+
+
+# Identical bytes parse and embed identically, so a duplicate upload copies the
+# existing chunk rows server-side instead of going through the pipeline.
+def reuse_document_chunks(db: Session, document: Document, source: Document) -> None:
+    columns = [getattr(DocumentChunk, name) for name in REUSED_CHUNK_COLUMNS]
+    db.execute(
+        insert(DocumentChunk).from_select(
+            ["document_id", "project_id", "created_at", *REUSED_CHUNK_COLUMNS],
+            select(
+                literal(document.id),
+                literal(document.project_id),
+                literal(datetime.utcnow()),
+                *columns,
+            )
+            .where(DocumentChunk.document_id == source.id)
+            .order_by(DocumentChunk.id),
+        )
+    )
+    document.text_excerpt = source.text_excerpt
+    document.metadata_json = {**(source.metadata_json or {}), "duplicate_of": source.id}
+    document.status = "ready"
+    bump_index_version(db, document.project_id)
+
+
+# Raises on transient errors so the job queue can retry; documents that can
+# never be ingested are marked failed here instead. Pages, chunks and
+# embeddings are streamed in INGESTION_BATCH_SIZE batches, and every batch is
+# flushed into a single transaction that commits once the document is done.
+# Stage timings are exclusive: "chunk" excludes the time spent waiting on
+# "parse" for pages.
+def ingest_document(db: Session, document_id: int, source_path: str | None) -> None:
+    document = db.get(Document, document_id)
+    if not document:
+        return
+
+    source = find_reusable_document(db, document)
+    if source is not None:
+        reuse_document_chunks(db, document, source)
+        db.commit()
+        return
+
+    if document.doc_type == "url" and document.source_url:
+        sync_url_document(db, document, conditional=False)
+        return
+
+    report_progress(document_id, "parsing")
+    pages = _iter_document_pages(document, source_path)
+    if pages is None:
+        document.status = "failed"
+        document.metadata_json = {"error": "Nothing to ingest for this document."}
+        db.commit()
+        return
+
+    summary = {"pages": 0, "excerpt": ""}
+    clock = stage_clock(INGESTION_STAGE_SECONDS)
+    pages = clock.iterate("parse", _observe_pages(pages, summary))
+    chunks = clock.iterate("chunk", iter_chunks(pages))
+    chunk_count = 0
+    while batch := list(islice(chunks, settings.ingestion_batch_size)):
+        with clock.stage("embed"):
+            embed_chunks(batch)
+        with clock.stage("persist"):
+            write_chunks(db, document.project_id, document.id, batch)
+        chunk_count += len(batch)
+        report_progress(document_id, "embedding", pages=summary["pages"], chunks=chunk_count)
+
+    document.text_excerpt = summary["excerpt"]
+    if not chunk_count:
+        document.metadata_json = {
+            "page_count": summary["pages"],
+            "error": "No extractable text found in this document.",
+        }
+        document.status = "failed"
+        db.commit()
+        return
+
+    document.metadata_json = {"page_count": summary["pages"], "chunk_count": chunk_count}
+    document.status = "ready"
+    bump_index_version(db, document.project_id)
+    with clock.stage("commit"):
+        db.commit()
+    clock.finish()
+
+
+def _chunk_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# Fetches a URL document and reconciles its chunks with the page: chunks whose
+# content is unchanged (and embedded by the active model) are kept, only new
+# or changed chunks are embedded and written, and the rest are deleted.
+def sync_url_document(db: Session, document: Document, conditional: bool = True) -> None:
+    metadata = dict(document.metadata_json or {})
+    validators = metadata.get("http", {}) if conditional else {}
+    page = fetch_url(document.source_url, validators.get("etag"), validators.get("last_modified"))
+    document.last_fetched_at = datetime.utcnow()
+    if page is None:
+        db.commit()
+        return
+
+    text = html_to_text(page.html)
+    chunks = build_chunks([(1, text)])
+    if not chunks:
+        document.text_excerpt = text[:EXCERPT_CHARS]
+        document.metadata_json = {"page_count": 1, "error": "No extractable text found in this document."}
+        document.status = "failed"
+        db.commit()
+        return
+
+    model = embedding_model_name()
+    existing = defaultdict(list)
+    stale_ids = []
+    for chunk_id, content, chunk_model in db.execute(
+        select(DocumentChunk.id, DocumentChunk.content, DocumentChunk.embedding_model).where(
+            DocumentChunk.document_id == document.id
+        )
+    ):
+        if chunk_model == model:
+            existing[_chunk_hash(content)].append(chunk_id)
+        else:
+            stale_ids.append(chunk_id)
+
+    added = []
+    for chunk in chunks:
+        matches = existing.get(_chunk_hash(chunk["content"]))
+        if matches:
+            matches.pop()
+        else:
+            added.append(chunk)
+    stale_ids.extend(chunk_id for ids in existing.values() for chunk_id in ids)
+
+    if stale_ids:
+        db.execute(delete(DocumentChunk).where(DocumentChunk.id.in_(stale_ids)))
+    if added:
+        write_chunks(db, document.project_id, document.id, embed_chunks(added))
+    document.text_excerpt = text[:EXCERPT_CHARS]
+    document.metadata_json = {
+        "page_count": 1,
+        "chunk_count": len(chunks),
+        "http": {"etag": page.etag, "last_modified": page.last_modified},
+        "refresh": {"added": len(added), "removed": len(stale_ids)},
+    }
+    document.status = "ready"
+    if added or stale_ids:
+        bump_index_version(db, document.project_id, removed=bool(stale_ids))
+    db.commit()
+
+
+def refresh_document(db: Session, document_id: int) -> None:
+    document = db.get(Document, document_id)
+    if document and document.doc_type == "url" and document.source_url:
+        sync_url_document(db, document)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import and_, exists, extract, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Document, IngestionJob
+
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key so only one worker schedules URL refreshes at a time.
+URL_REFRESH_LOCK = 0x55524C52
+
+
+# Raised by job handlers for failures that retrying cannot fix.
+class PermanentJobError(Exception):
+    pass
+
+
+# Queued or running jobs of a document; a second one would write its chunks
+# concurrently with the first.
+def pending_document_job(document_id=Document.id):
+    return exists().where(
+        IngestionJob.document_id == document_id,
+        IngestionJob.status.in_(("queued", "running")),
+    )
+
+
+def enqueue_ingestion(
+    db: Session | AsyncSession, document: Document, source_path: Path | None = None
+) -> IngestionJob:
+    job = IngestionJob(
+        document_id=document.id,
+        project_id=document.project_id,
+        payload={"source_path": str(source_path)} if source_path else {},
+        max_attempts=settings.ingestion_max_attempts,
+    )
+    db.add(job)
+    document.metadata_json = {"progress": {"stage": "queued"}}
+    return job
+
+
+def enqueue_refresh(db: Session | AsyncSession, document: Document) -> IngestionJob:
+    job = IngestionJob(
+        document_id=document.id,
+        project_id=document.project_id,
+        kind="refresh",
+        payload={},
+        max_attempts=settings.ingestion_max_attempts,
+    )
+    db.add(job)
+    return job
+
+
+def enqueue_crawl(
+    db: Session | AsyncSession, project_id: int, urls: List[str], sitemap_url: str | None, max_pages: int
+) -> IngestionJob:
+    job = IngestionJob(
+        project_id=project_id,
+        kind="crawl",
+        payload={"urls": urls, "sitemap_url": sitemap_url, "max_pages": max_pages},
+        progress={"stage": "queued"},
+        max_attempts=settings.ingestion_max_attempts,
+    )
+    db.add(job)
+    return job
+
+
+def schedule_url_refreshes(db: Session) -> int:
+    if settings.url_refresh_interval_seconds <= 0:
+        return 0
+    if not db.scalar(select(func.pg_try_advisory_xact_lock(URL_REFRESH_LOCK))):
+        return 0
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.url_refresh_interval_seconds)
+    due = (
+        select(
+            Document.id,
+            Document.project_id,
+            literal("refresh"),
+            literal("queued"),
+            literal(0),
+            literal(settings.ingestion_max_attempts),
+            literal(now),
+            literal(now),
+        )
+        .where(
+            Document.doc_type == "url",
+            Document.status == "ready",
+            or_(Document.last_fetched_at.is_(None), Document.last_fetched_at < cutoff),
+            ~pending_document_job(),
+        )
+        .order_by(Document.last_fetched_at.asc().nulls_first())
+        .limit(settings.url_refresh_batch_size)
+    )
+    result = db.execute(
+        insert(IngestionJob).from_select(
+            [
+                "document_id",
+                "project_id",
+                "kind",
+                "status",
+                "attempts",
+                "max_attempts",
+                "available_at",
+                "created_at",
+            ],
+            due,
+        )
+    )
+    db.commit()
+    if result.rowcount:
+        logger.info("Scheduled %s URL refreshes", result.rowcount)
+    return result.rowcount
+
+
+def claim_jobs(db: Session, worker_id: str, limit: int) -> List[int]:
+    now = datetime.utcnow()
+    # Running jobs whose lease lapsed belong to a worker that died mid-job.
+    expired = now - timedelta(seconds=settings.ingestion_lease_seconds)
+    jobs = db.scalars(
+        select(IngestionJob)
+        .where(
+            or_(
+                and_(IngestionJob.status == "queued", IngestionJob.available_at <= now),
+                and_(IngestionJob.status == "running", IngestionJob.locked_at < expired),
+            )
+        )
+        .order_by(IngestionJob.available_at, IngestionJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+    claimed = []
+    for job in jobs:
+        if job.status == "running" and job.attempts >= job.max_attempts:
+            _give_up(db, job, job.last_error or "Worker lost while processing the job", now)
+            continue
+        job.status = "running"
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.started_at = job.started_at or now
+        job.attempts += 1
+        claimed.append(job.id)
+    db.commit()
+    return claimed
+
+
+def heartbeat(db: Session, worker_id: str, job_ids: List[int]) -> None:
+    if not job_ids:
+        return
+    db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id.in_(job_ids), IngestionJob.locked_by == worker_id)
+        .values(locked_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+def complete_job(db: Session, job_id: int) -> None:
+    job = db.get(IngestionJob, job_id)
+    job.status = "done"
+    job.finished_at = datetime.utcnow()
+    job.locked_by = None
+    db.commit()
+
+
+def fail_job(db: Session, job_id: int, error: str, retry: bool = True) -> None:
+    job = db.get(IngestionJob, job_id)
+    now = datetime.utcnow()
+    job.last_error = error[:2000]
+    job.locked_by = None
+    if retry and job.attempts < job.max_attempts:
+        delay = settings.ingestion_retry_base_seconds * 2 ** (job.attempts - 1)
+        job.status = "queued"
+        job.available_at = now + timedelta(seconds=delay)
+        document = db.get(Document, job.document_id) if job.document_id else None
+        if document and job.kind == "ingest":
+            document.metadata_json = {
+                "progress": {"stage": "retrying", "attempt": job.attempts, "error": job.last_error}
+            }
+        logger.warning("Ingestion job %s failed, retrying in %.0fs: %s", job.id, delay, error)
+    else:
+        _give_up(db, job, job.last_error, now)
+    db.commit()
+
+
+def _give_up(db: Session, job: IngestionJob, error: str, now: datetime) -> None:
+    job.status = "failed"
+    job.finished_at = now
+    job.locked_by = None
+    document = db.get(Document, job.document_id) if job.document_id else None
+    # A failed refresh leaves the previously ingested chunks searchable.
+    if document and job.kind == "refresh":
+        document.metadata_json = {**(document.metadata_json or {}), "refresh_error": error}
+    elif document:
+        document.status = "failed"
+        document.metadata_json = {"error": error}
+    logger.error("Ingestion job %s failed after %s attempts: %s", job.id, job.attempts, error)
+
+
+def queue_stats(db: Session) -> dict:
+    now = datetime.utcnow()
+    counts = dict(
+        db.execute(select(IngestionJob.status, func.count()).group_by(IngestionJob.status)).all()
+    )
+    oldest = db.scalar(
+        select(func.min(IngestionJob.created_at)).where(IngestionJob.status == "queued")
+    )
+    wait, run, finished = db.execute(
+        select(
+            func.avg(extract("epoch", IngestionJob.started_at - IngestionJob.created_at)),
+            func.avg(extract("epoch", IngestionJob.finished_at - IngestionJob.started_at)),
+            func.count(),
+        ).where(IngestionJob.status == "done", IngestionJob.finished_at >= now - timedelta(hours=1))
+    ).one()
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "failed": counts.get("failed", 0),
+        "done": counts.get("done", 0),
+        "oldest_queued_seconds": (now - oldest).total_seconds() if oldest else 0.0,
+        "done_last_hour": finished,
+        "avg_wait_seconds": float(wait or 0.0),
+        "avg_run_seconds": float(run or 0.0),
+    }
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import re
+import zlib
+from itertools import chain
+from typing import List, Sequence
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have if in into is it its of on or "
+    "so such that the their then there these they this to was were will with".split()
+)
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+CHAR_WEIGHT = 0.2
+NGRAM_PRIME = np.uint64(1099511628211)
+TOKEN_CACHE_LIMIT = 500_000
+# Outside the crc32 range, so stopwords can be dropped after vectorised lookup.
+STOPWORD_HASH = 1 << 40
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    hashes = hashes ^ (hashes >> np.uint64(33))
+    hashes = hashes * np.uint64(0xFF51AFD7ED558CCD)
+    return hashes ^ (hashes >> np.uint64(33))
+
+
+class HashingEmbedder:
+    # Feature-hashed bag of words, word bigrams and character trigrams with
+    # sublinear term frequency. Lexical rather than semantic, but it needs no
+    # model files and scores overlapping wording consistently offline.
+    persist_cache = False
+
+    def __init__(self, dims: int = 512) -> None:
+        self.dims = dims
+        self.model_name = f"local-hashing-v1-{dims}"
+        self._token_hashes: dict[str, int] = {}
+
+    def embed(self, texts: Sequence[str]) -> List[np.ndarray]:
+        return list(self.embed_matrix(texts))
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        lowered = [text.lower() for text in texts]
+        word_rows, word_hashes = self._word_features(lowered)
+        bigram_rows, bigram_hashes = self._bigram_features(word_rows, word_hashes)
+        char_rows, char_hashes = self._char_features(lowered)
+
+        rows = np.concatenate((word_rows, bigram_rows, char_rows))
+        mixed = _mix(np.concatenate((word_hashes, bigram_hashes, char_hashes)))
+        weights = np.concatenate(
+            (
+                np.full(len(word_rows), WORD_WEIGHT),
+                np.full(len(bigram_rows), BIGRAM_WEIGHT),
+                np.full(len(char_rows), CHAR_WEIGHT),
+            )
+        )
+        buckets = (mixed >> np.uint64(32)) % np.uint64(self.dims)
+        signs = np.where((mixed >> np.uint64(31)) & np.uint64(1), 1.0, -1.0)
+        flat = rows * self.dims + buckets.astype(np.int64)
+        counts = np.bincount(flat, weights=signs * weights, minlength=len(texts) * self.dims)
+        matrix = counts.reshape(len(texts), self.dims)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+        return matrix.astype(np.float32)
+
+    def _word_features(self, texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        token_lists = [TOKEN_PATTERN.findall(text) for text in texts]
+        tokens = list(chain.from_iterable(token_lists))
+        # A full table is replaced rather than cleared: other threads may be
+        # reading their tokens from it.
+        table = self._token_hashes
+        missing = set(tokens).difference(table)
+        if len(table) + len(missing) > TOKEN_CACHE_LIMIT:
+            table = self._token_hashes = {}
+            missing = set(tokens)
+        if not table:
+            table.update(dict.fromkeys(STOPWORDS, STOPWORD_HASH))
+            missing.difference_update(STOPWORDS)
+        table.update((token, zlib.crc32(token.encode("utf-8"))) for token in missing)
+
+        hashes = np.fromiter(map(table.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+        counts = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+        keep = hashes != STOPWORD_HASH
+        return rows[keep], hashes[keep]
+
+    def _bigram_features(
+        self, rows: np.ndarray, hashes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        same_text = rows[:-1] == rows[1:]
+        bigrams = hashes[:-1] * NGRAM_PRIME + hashes[1:] + np.uint64(0x5BD1E995)
+        return rows[:-1][same_text], bigrams[same_text]
+
+    def _char_features(self, texts: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        encoded = [text.encode("utf-8") for text in texts]
+        if not encoded:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+        data = np.frombuffer(b"\x00".join(encoded) + b"\x00", dtype=np.uint8).astype(np.uint64)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) + 1
+        rows = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+        # ASCII punctuation and whitespace all become a single word separator.
+        is_alnum = np.zeros(256, dtype=bool)
+        is_alnum[np.frombuffer(b"abcdefghijklmnopqrstuvwxyz0123456789", dtype=np.uint8)] = True
+        is_alnum[128:] = True
+        data = np.where(is_alnum[data], data, np.uint64(32))
+        data[np.cumsum(lengths) - 1] = 0
+
+        first, second, third = data[:-2], data[1:-1], data[2:]
+        valid = (first != 0) & (second != 0) & (third != 0) & (second != 32)
+        trigrams = (first * NGRAM_PRIME + second) * NGRAM_PRIME + third
+        return rows[:-2][valid], trigrams[valid]
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Tuple, TypeVar
+
+from app.config import settings
+
+
+T = TypeVar("T")
+
+# Seconds, from 1 ms to 30 s.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (stage, seconds) timed while handling the current request, for Server-Timing.
+_request_timings: ContextVar[List[Tuple[str, float]] | None] = ContextVar("request_timings", default=None)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: str) -> None:
+        if not settings.metrics_enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {total:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0.0] * (len(self.buckets) + 2)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[idx] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    # take() and merge() move observations between processes, e.g. from
+    # ingestion pool processes to the worker that exports them.
+    def take(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], List[float]]) -> None:
+        with self._lock:
+            for label_values, series in values.items():
+                current = self._values.setdefault(label_values, [0.0] * len(series))
+                for idx, count in enumerate(series):
+                    current[idx] += count
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _labels(self.labels + ("le",), values + (le,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative:g}")
+                labels = _labels(self.labels, values)
+                lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{labels} {cumulative:g}")
+        return lines
+
+
+RAG_STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent answering a question, per stage.", ("stage",))
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds", "Time spent ingesting a document, per stage.", ("stage",)
+)
+CHUNKS_SCORED = Counter("retrieval_chunks_scored_total", "Chunk vectors scored against a query.")
+PROMPT_TOKENS = Counter("rag_prompt_tokens_total", "Prompt tokens sent to the LLM.")
+REGISTRY = (RAG_STAGE_SECONDS, INGESTION_STAGE_SECONDS, CHUNKS_SCORED, PROMPT_TOKENS)
+
+
+class _Timer:
+    __slots__ = ("histogram", "stage", "started")
+
+    def __init__(self, histogram: Histogram, stage: str) -> None:
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self.started
+        self.histogram.observe(elapsed, self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+# `with timer(RAG_STAGE_SECONDS, "retrieve"):` records the block's duration;
+# with metrics disabled it costs one settings lookup.
+def timer(histogram: Histogram, stage: str) -> _Timer | _NoTimer:
+    if not settings.metrics_enabled:
+        return _NO_TIMER
+    return _Timer(histogram, stage)
+
+
+# Splits one operation's wall time into exclusive stages: entering a stage
+# pauses the enclosing one, so a chunker pulling pages from a parser is
+# charged only for chunking. Totals are observed once, by finish().
+class StageClock:
+    def __init__(self, histogram: Histogram) -> None:
+        self.histogram = histogram
+        self.totals: Dict[str, float] = {}
+        self._stage: str | None = None
+        self._since = time.perf_counter()
+
+    def _switch(self, stage: str | None) -> str | None:
+        now = time.perf_counter()
+        if self._stage is not None:
+            self.totals[self._stage] = self.totals.get(self._stage, 0.0) + now - self._since
+        previous, self._stage, self._since = self._stage, stage, now
+        return previous
+
+    def stage(self, name: str) -> _ClockStage:
+        return _ClockStage(self, name)
+
+    def iterate(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            previous = self._switch(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._switch(previous)
+            yield item
+
+    def finish(self) -> None:
+        for name, seconds in self.totals.items():
+            self.histogram.observe(seconds, name)
+
+
+class _ClockStage:
+    __slots__ = ("clock", "name", "previous")
+
+    def __init__(self, clock: StageClock, name: str) -> None:
+        self.clock = clock
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.previous = self.clock._switch(self.name)
+
+    def __exit__(self, *exc_info) -> None:
+        self.clock._switch(self.previous)
+
+
+class _NoClock:
+    def stage(self, name: str) -> _NoTimer:
+        return _NO_TIMER
+
+    def iterate(self, name: str, items: Iterable[T]) -> Iterable[T]:
+        return items
+
+    def finish(self) -> None:
+        pass
+
+
+def stage_clock(histogram: Histogram) -> StageClock | _NoClock:
+    if not settings.metrics_enabled:
+        return _NoClock()
+    return StageClock(histogram)
+
+
+# Starts collecting stage timings for the current request; returns None when
+# metrics are disabled.
+def collect_request_timings() -> List[Tuple[str, float]] | None:
+    if not settings.metrics_enabled:
+        return None
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+# Prometheus text format. cache_stats maps a cache name to its hits, misses
+# and entries, and openai_stats is openai_clients.client_stats(); both come
+# from their own counters, so they are exported even with METRICS_ENABLED off.
+def render(cache_stats: Dict[str, dict] | None = None, openai_stats: dict | None = None) -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for name, key, kind, documentation in (
+        ("cache_hits_total", "hits", "counter", "Cache lookups that found an entry."),
+        ("cache_misses_total", "misses", "counter", "Cache lookups that found nothing."),
+        ("cache_entries", "entries", "gauge", "Entries currently cached."),
+    ):
+        samples = [(cache, stats[key]) for cache, stats in (cache_stats or {}).items() if key in stats]
+        if samples:
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"])
+            lines.extend(f'{name}{{cache="{cache}"}} {value:g}' for cache, value in samples)
+    if openai_stats:
+        connections = openai_stats["connections"]
+        lines.extend([
+            "# HELP openai_requests_total HTTP requests sent to the OpenAI API.",
+            "# TYPE openai_requests_total counter",
+            f"openai_requests_total {connections['requests']}",
+            "# HELP openai_connections_opened_total TCP connections opened to the OpenAI API.",
+            "# TYPE openai_connections_opened_total counter",
+            f"openai_connections_opened_total {connections['connections_opened']}",
+            "# HELP openai_circuit_open 1 while calls to the provider are short-circuited.",
+            "# TYPE openai_circuit_open gauge",
+        ])
+        for circuit, state in openai_stats["circuits"].items():
+            lines.append(f'openai_circuit_open{{circuit="{circuit}"}} {int(state["state"] != "closed")}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name} provider circuit is open; next attempt in {retry_in:.0f}s")
+
+
+# Closed: calls go through. Open: calls fail fast until reset_seconds have
+# passed. Half-open: a single trial call closes or reopens the circuit.
+# State is per process.
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    # Returns True when the call is the half-open trial.
+    def before_call(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return False
+            waited = time.monotonic() - self.opened_at
+            if self.state == "open" and waited >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(self.reset_seconds - waited, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info("%s provider circuit closed", self.name)
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    # For calls that proved nothing about the provider's health (rate limited
+    # or cancelled): frees the half-open trial slot without counting.
+    def release_trial(self) -> None:
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failure_threshold <= 0:
+                return
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                    logger.warning(
+                        "%s provider circuit opened after %s failures", self.name, self.failures
+                    )
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opens": self.opens,
+                "rejected": self.rejected,
+            }
+
+
+embedding_breaker = CircuitBreaker(
+    "embeddings", settings.openai_breaker_failures, settings.openai_breaker_reset_seconds
+)
+chat_breaker = CircuitBreaker("chat", settings.openai_breaker_failures, settings.openai_breaker_reset_seconds)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+# True when the provider is down, overloaded or short-circuited, i.e. when a
+# caller should use its local fallback rather than fail the request.
+def provider_unavailable(exc: Exception) -> bool:
+    return isinstance(exc, CircuitOpenError) or is_retryable(exc)
+
+
+def retry_delay(exc: Exception, attempt: int) -> float:
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter keeps concurrent workers from retrying in lockstep.
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2**attempt))
+
+
+def _record_error(breaker: CircuitBreaker, exc: Exception, trial: bool) -> None:
+    if isinstance(exc, openai.RateLimitError):
+        if trial:
+            breaker.release_trial()
+    elif is_retryable(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+# Every 5xx or connection failure counts towards opening the breaker, so a
+# call that is still retrying when the circuit opens stops at its next
+# attempt. Rate limits are waited out (retry-after) without counting, and a
+# response that isn't retryable (e.g. 400) still shows the provider is up.
+def call_with_retries(breaker: CircuitBreaker, call: Callable[[], T], max_retries: int) -> T:
+    attempt = 0
+    while True:
+        trial = breaker.before_call()
+        try:
+            result = call()
+        except Exception as exc:
+            _record_error(breaker, exc, trial)
+            if not is_retryable(exc) or attempt >= max_retries:
+                raise
+            delay = retry_delay(exc, attempt)
+            logger.warning("%s request failed (%s), retrying in %.2fs", breaker.name, exc, delay)
+            time.sleep(delay)
+            attempt += 1
+        except BaseException:
+            if trial:
+                breaker.release_trial()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+async def call_with_retries_async(
+    breaker: CircuitBreaker, call: Callable[[], Awaitable[T]], max_retries: int
+) -> T:
+    attempt = 0
+    while True:
+        trial = breaker.before_call()
+        try:
+            result = await call()
+        except Exception as exc:
+            _record_error(breaker, exc, trial)
+            if not is_retryable(exc) or attempt >= max_retries:
+                raise
+            delay = retry_delay(exc, attempt)
+            logger.warning("%s request failed (%s), retrying in %.2fs", breaker.name, exc, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+        except BaseException:
+            # Cancelled, e.g. the client disconnected; a half-open trial
+            # must not stay claimed.
+            if trial:
+                breaker.release_trial()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+class ConnectionStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    # httpcore reports each new TCP connection through the "trace" request
+    # extension; requests without one reused a pooled connection.
+    def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+
+    async def _trace_async(self, event: str, info: dict) -> None:
+        self._trace(event, info)
+
+    def on_request(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+        with self._lock:
+            self.requests += 1
+
+    async def on_request_async(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace_async
+        with self._lock:
+            self.requests += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            reused = self.requests - self.connections
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "reuse_rate": reused / self.requests if self.requests else 0.0,
+            }
+
+
+connection_stats = ConnectionStats()
+
+ClientKey = Tuple[str | None, str | None]
+_clients: Dict[ClientKey, OpenAI] = {}
+# httpx async connections belong to the event loop that opened them.
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ClientKey, AsyncOpenAI]] = (
+    weakref.WeakKeyDictionary()
+)
+_clients_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_connections,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds)
+
+
+# Long-lived clients, one per API key and base URL, so calls reuse pooled
+# keep-alive connections. Retries are done by call_with_retries, not the SDK.
+def openai_client() -> OpenAI:
+    key = (settings.openai_api_key, settings.openai_base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=_limits(), timeout=_timeout(), event_hooks={"request": [connection_stats.on_request]}
+            )
+            client = _clients[key] = OpenAI(
+                api_key=key[0], base_url=key[1], max_retries=0, timeout=_timeout(), http_client=http_client
+            )
+    return client
+
+
+def async_openai_client() -> AsyncOpenAI:
+    key = (settings.openai_api_key, settings.openai_base_url)
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=_limits(),
+                timeout=_timeout(),
+                event_hooks={"request": [connection_stats.on_request_async]},
+            )
+            client = clients[key] = AsyncOpenAI(
+                api_key=key[0], base_url=key[1], max_retries=0, timeout=_timeout(), http_client=http_client
+            )
+    return client
+
+
+async def close_clients() -> None:
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        async_clients = list(_async_clients.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        client.close()
+    for async_client in async_clients:
+        await async_client.close()
+
+
+def client_stats() -> dict:
+    return {
+        "connections": connection_stats.stats(),
+        "circuits": {breaker.name: breaker.stats() for breaker in (embedding_breaker, chat_breaker)},
+    }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.models import Document, DocumentChunk
+from app.services.tokens import count_tokens, truncate_tokens
+
+
+# Shortest suffix/prefix match treated as chunk overlap rather than chance.
+MIN_MERGE_OVERLAP = 20
+# Chunks at least this similar to one already chosen add nothing to the prompt.
+DUPLICATE_SIMILARITY = 0.95
+# A source cut to fewer tokens than this is left out instead.
+MIN_SOURCE_TOKENS = 32
+
+Selected = Tuple[DocumentChunk, Document, float]
+
+
+@dataclass
+class Source:
+    document: Document
+    page_number: int | None
+    content: str
+    score: float
+    chunk_ids: List[int] = field(default_factory=list)
+
+
+def _overlap(left: str, right: str) -> int:
+    # Length of the longest suffix of `left` that is a prefix of `right`.
+    probe = right[:MIN_MERGE_OVERLAP]
+    if len(probe) < MIN_MERGE_OVERLAP:
+        return 0
+    start = max(0, len(left) - len(right))
+    while True:
+        idx = left.find(probe, start)
+        if idx < 0:
+            return 0
+        if right.startswith(left[idx:]):
+            return len(left) - idx
+        start = idx + 1
+
+
+def mmr_select(
+    selected: List[Selected], vectors: Dict[int, np.ndarray], lambda_: float
+) -> List[Selected]:
+    remaining = list(selected)
+    chosen: List[Selected] = []
+    chosen_vectors: List[np.ndarray] = []
+    while remaining:
+        best, best_value, best_redundancy = None, -np.inf, 0.0
+        for item in remaining:
+            vector = vectors.get(item[0].id)
+            redundancy = 0.0
+            if vector is not None:
+                redundancy = max((float(vector @ other) for other in chosen_vectors), default=0.0)
+            value = lambda_ * item[2] - (1 - lambda_) * redundancy
+            if value > best_value:
+                best, best_value, best_redundancy = item, value, redundancy
+        remaining.remove(best)
+        if best_redundancy >= DUPLICATE_SIMILARITY:
+            continue
+        chosen.append(best)
+        if vectors.get(best[0].id) is not None:
+            chosen_vectors.append(vectors[best[0].id])
+    return chosen
+
+
+# Chunks of the same document page that overlap (CHUNK_OVERLAP) or sit next
+# to each other become one source, placed where its best chunk ranked.
+def merge_chunks(selected: List[Selected]) -> List[Source]:
+    groups: Dict[Tuple[int, int | None], List[Selected]] = {}
+    for item in selected:
+        groups.setdefault((item[1].id, item[0].page_number), []).append(item)
+
+    ranked: List[Tuple[int, Source]] = []
+    rank = {item[0].id: position for position, item in enumerate(selected)}
+    for items in groups.values():
+        items.sort(key=lambda item: item[0].id)
+        current = None
+        for chunk, document, score in items:
+            if current is not None:
+                overlap = _overlap(current.content, chunk.content)
+                if overlap or chunk.id == current.chunk_ids[-1] + 1:
+                    current.content += chunk.content[overlap:] if overlap else " " + chunk.content
+                    current.score = max(current.score, score)
+                    current.chunk_ids.append(chunk.id)
+                    continue
+                ranked.append((min(rank[i] for i in current.chunk_ids), current))
+            current = Source(document, chunk.page_number, chunk.content, score, [chunk.id])
+        ranked.append((min(rank[i] for i in current.chunk_ids), current))
+    return [source for _, source in sorted(ranked, key=lambda item: item[0])]
+
+
+def pack_sources(sources: List[Source], budget: int) -> List[Source]:
+    packed = []
+    remaining = budget
+    for source in sources:
+        tokens = count_tokens(source.content)
+        if tokens > remaining:
+            if remaining < MIN_SOURCE_TOKENS:
+                break
+            source.content = truncate_tokens(source.content, remaining)
+            tokens = remaining
+        packed.append(source)
+        remaining -= tokens
+    return packed
@@ -1,20 +1,58 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from typing import List, Tuple
+from typing import AsyncIterator, Iterator, List, Tuple
 
-from openai import OpenAI
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.config import settings
-from app.models import ChatMessage, Document, DocumentChunk, Project
+from app.db import SessionLocal
+from app.models import ChatMessage, Project
 from app.schemas import Citation
-from app.services.embeddings import embed_texts
-from app.services.vector_store import cosine_similarity, top_k
+from app.services.answer_cache import Scope, answer_cache
+from app.services.embeddings import embed_texts, embed_texts_async
+from app.services.metrics import PROMPT_TOKENS, RAG_STAGE_SECONDS, timer
+from app.services.openai_clients import (
+    CircuitOpenError,
+    async_openai_client,
+    call_with_retries,
+    call_with_retries_async,
+    chat_breaker,
+    openai_client,
+    provider_unavailable,
+)
+from app.services.prompt_builder import merge_chunks, mmr_select, pack_sources
+from app.services.retrieval import chunk_vectors, load_chunks, search_chunks
+from app.services.tokens import count_tokens
 
 
+logger = logging.getLogger(__name__)
+
 MIN_SIMILARITY = 0.18
 TOP_K = 8
+NO_ANSWER = "I don't know."
+
+
+@dataclass
+class AnswerContext:
+    question: str
+    prompt: str | None = None
+    prompt_chunks: List[Tuple[int, str]] = field(default_factory=list)
+    citations: List[Citation] = field(default_factory=list)
+    used_chunks: List[dict] = field(default_factory=list)
+    query_embedding: List[float] | None = None
+    cached: bool = False
+    # Built or answered by a local fallback while the provider was unavailable.
+    degraded: bool = False
+    prompt_tokens: int | None = None
+
+    @property
+    def has_sources(self) -> bool:
+        return self.prompt is not None
 
 
 def _format_prompt(question: str, chunks: List[Tuple[int, str]]) -> str:
@@ -27,100 +65,330 @@ def _format_prompt(question: str, chunks: List[Tuple[int, str]]) -> str:
     )
 
 
-def _llm_answer(prompt: str) -> str:
-    client = OpenAI(api_key=settings.openai_api_key)
-    response = client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-    )
+def _chat_request(context: AnswerContext, stream: bool = False) -> dict:
+    return {
+        "model": settings.openai_model,
+        "messages": [{"role": "user", "content": context.prompt}],
+        "temperature": 0.2,
+        "stream": stream,
+    }
+
+
+def _llm_answer(context: AnswerContext) -> str:
+    PROMPT_TOKENS.inc(context.prompt_tokens or 0)
+    client = openai_client()
+    with timer(RAG_STAGE_SECONDS, "llm"):
+        response = call_with_retries(
+            chat_breaker,
+            lambda: client.chat.completions.create(**_chat_request(context)),
+            settings.llm_max_retries,
+        )
     return response.choices[0].message.content.strip()
 
 
+async def _llm_answer_async(context: AnswerContext) -> str:
+    PROMPT_TOKENS.inc(context.prompt_tokens or 0)
+    client = async_openai_client()
+    with timer(RAG_STAGE_SECONDS, "llm"):
+        response = await call_with_retries_async(
+            chat_breaker,
+            lambda: client.chat.completions.create(**_chat_request(context)),
+            settings.llm_max_retries,
+        )
+    return response.choices[0].message.content.strip()
+
+
+# Streamed "llm" timings run until the last token has been consumed. Only
+# opening the stream is retried.
+def _llm_stream(context: AnswerContext) -> Iterator[str]:
+    PROMPT_TOKENS.inc(context.prompt_tokens or 0)
+    client = openai_client()
+    with timer(RAG_STAGE_SECONDS, "llm"):
+        stream = call_with_retries(
+            chat_breaker,
+            lambda: client.chat.completions.create(**_chat_request(context, stream=True)),
+            settings.llm_max_retries,
+        )
+        for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
+async def _llm_stream_async(context: AnswerContext) -> AsyncIterator[str]:
+    PROMPT_TOKENS.inc(context.prompt_tokens or 0)
+    client = async_openai_client()
+    with timer(RAG_STAGE_SECONDS, "llm"):
+        stream = await call_with_retries_async(
+            chat_breaker,
+            lambda: client.chat.completions.create(**_chat_request(context, stream=True)),
+            settings.llm_max_retries,
+        )
+        async for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
 def _fallback_answer(question: str, chunks: List[Tuple[int, str]]) -> str:
     if not chunks:
-        return "I don't know."
+        return NO_ANSWER
     top_snippet = chunks[0][1]
     return f"{top_snippet} [1]"
 
 
-def answer_question(
-    db: Session, project: Project, user_id: int, question: str
-) -> tuple[str, List[Citation], List[dict]]:
-    chunk_rows = (
-        db.query(DocumentChunk, Document)
-        .join(Document, Document.id == DocumentChunk.document_id)
-        .filter(DocumentChunk.project_id == project.id)
-        .all()
-    )
+def _embed_question(question: str) -> List[float] | None:
+    try:
+        with timer(RAG_STAGE_SECONDS, "embed_query"):
+            return embed_texts([question])[0]
+    except Exception as exc:
+        if not provider_unavailable(exc):
+            raise
+        log = logger.debug if isinstance(exc, CircuitOpenError) else logger.warning
+        log("Embedding provider unavailable (%s); retrieving by full text", exc)
+        return None
 
-    if not chunk_rows:
-        answer = "I don't know."
-        citations: List[Citation] = []
-        used_chunks: List[dict] = []
-        return answer, citations, used_chunks
 
-    valid_rows = [row for row in chunk_rows if row[0].embedding]
-    if not valid_rows:
-        answer = "I don't know."
-        citations = []
-        used_chunks = []
-        return answer, citations, used_chunks
+async def _embed_question_async(question: str) -> List[float] | None:
+    try:
+        with timer(RAG_STAGE_SECONDS, "embed_query"):
+            return (await embed_texts_async([question]))[0]
+    except Exception as exc:
+        if not provider_unavailable(exc):
+            raise
+        log = logger.debug if isinstance(exc, CircuitOpenError) else logger.warning
+        log("Embedding provider unavailable (%s); retrieving by full text", exc)
+        return None
 
-    embeddings = [row[0].embedding for row in valid_rows]
-    query_embedding = embed_texts([question])[0]
-    similarities = cosine_similarity(query_embedding, embeddings)
-    selected_indices = top_k(similarities, TOP_K)
 
-    selected = []
-    for idx in selected_indices:
-        chunk, document = valid_rows[idx]
-        score = similarities[idx]
-        selected.append((chunk, document, score))
+# Without a query embedding (provider unavailable) retrieval is full-text only.
+def _context_for_embedding(
+    db: Session,
+    project: Project,
+    question: str,
+    query_embedding: List[float] | None,
+    search_mode: str | None = None,
+) -> AnswerContext:
+    context = AnswerContext(question=question, query_embedding=query_embedding)
+    context.degraded = query_embedding is None
+    with timer(RAG_STAGE_SECONDS, "retrieve"):
+        hits = search_chunks(db, project, question, query_embedding, TOP_K, search_mode)
+    if not hits:
+        return context
 
+    # Chunks that contain every term of the question are kept below the
+    # similarity floor; exact identifiers often embed far from the question.
+    # Full-text ranks are not similarities, so degraded hits must match fully.
     min_similarity = 0.0 if not settings.openai_api_key else MIN_SIMILARITY
-    selected = [item for item in selected if item[2] >= min_similarity]
-    if not selected:
-        answer = "I don't know."
-        citations = []
-        used_chunks = []
-        return answer, citations, used_chunks
-
-    prompt_chunks = [(idx, item[0].content) for idx, item in enumerate(selected)]
-    prompt = _format_prompt(question, prompt_chunks)
-
-    if settings.openai_api_key:
-        answer = _llm_answer(prompt)
+    if context.degraded and min_similarity:
+        hits = [hit for hit in hits if hit.lexical]
     else:
-        answer = _fallback_answer(question, prompt_chunks)
+        hits = [hit for hit in hits if hit.lexical or hit.score >= min_similarity]
+    with timer(RAG_STAGE_SECONDS, "load_chunks"):
+        rows_by_id = load_chunks(db, [hit.chunk_id for hit in hits])
+    selected = []
+    for hit in hits:
+        if hit.chunk_id in rows_by_id:
+            chunk, document = rows_by_id[hit.chunk_id]
+            selected.append((chunk, document, hit.score))
+    if not selected:
+        return context
 
-    citations = []
-    used_chunks = []
-    for idx, (chunk, document, score) in enumerate(selected, start=1):
-        citations.append(
+    if settings.prompt_mmr and query_embedding is not None:
+        with timer(RAG_STAGE_SECONDS, "mmr"):
+            chunk_ids = [chunk.id for chunk, _, _ in selected]
+            vectors = chunk_vectors(db, project.id, len(query_embedding), chunk_ids)
+            selected = mmr_select(selected, vectors, settings.prompt_mmr_lambda)
+    # Each merged source is one numbered entry, so [n] in the answer maps to
+    # citations[n - 1].
+    with timer(RAG_STAGE_SECONDS, "pack"):
+        sources = pack_sources(merge_chunks(selected), settings.prompt_token_budget)
+        context.prompt_chunks = [(idx, source.content) for idx, source in enumerate(sources)]
+        context.prompt = _format_prompt(question, context.prompt_chunks)
+        context.prompt_tokens = count_tokens(context.prompt)
+    for source in sources:
+        context.citations.append(
             Citation(
-                document_id=document.id,
-                document_name=document.name,
-                page_number=chunk.page_number,
-                snippet=chunk.content[:400],
+                document_id=source.document.id,
+                document_name=source.document.name,
+                page_number=source.page_number,
+                snippet=source.content[:400],
             )
         )
-        used_chunks.append(
+        context.used_chunks.append(
             {
-                "document_id": document.id,
-                "document_name": document.name,
-                "content": chunk.content,
-                "page_number": chunk.page_number,
-                "score": score,
+                "document_id": source.document.id,
+                "document_name": source.document.name,
+                "content": source.content,
+                "page_number": source.page_number,
+                "score": source.score,
+                "chunk_ids": source.chunk_ids,
             }
         )
+    return context
+
+
+def build_answer_context(
+    db: Session, project: Project, question: str, search_mode: str | None = None
+) -> AnswerContext:
+    query_embedding = _embed_question(question)
+    return _context_for_embedding(db, project, question, query_embedding, search_mode)
+
+
+def _context_in_new_session(
+    project: Project, question: str, query_embedding: List[float] | None, search_mode: str | None
+) -> AnswerContext:
+    with SessionLocal() as db:
+        project = db.merge(project, load=False)
+        return _context_for_embedding(db, project, question, query_embedding, search_mode)
+
+
+# Retrieval shares the sync index cache and scoring code. Index builds, ANN
+# training and scoring are CPU-bound, so they run in a thread with their own
+# Session rather than on the event loop.
+async def _context_for_embedding_async(
+    project: Project, question: str, query_embedding: List[float] | None, search_mode: str | None = None
+) -> AnswerContext:
+    return await asyncio.to_thread(_context_in_new_session, project, question, query_embedding, search_mode)
+
+
+async def build_answer_context_async(
+    db: AsyncSession, project: Project, question: str, search_mode: str | None = None
+) -> AnswerContext:
+    query_embedding = await _embed_question_async(question)
+    return await _context_for_embedding_async(project, question, query_embedding, search_mode)
 
+
+def _cache_scope(project: Project, search_mode: str | None) -> Scope:
+    return project.id, project.index_version, search_mode or settings.search_mode
+
+
+def _from_cache(question: str, cached: Tuple[AnswerContext, str]) -> Tuple[AnswerContext, str]:
+    context, answer = cached
+    return replace(context, question=question, cached=True), answer
+
+
+# Returns the context and, on a cache hit, the cached answer. A miss still
+# reuses the question embedding computed for the near-duplicate lookup.
+def prepare_answer(
+    db: Session, project: Project, question: str, search_mode: str | None = None
+) -> Tuple[AnswerContext, str | None]:
+    scope = _cache_scope(project, search_mode)
+    cached = answer_cache.get(scope, question)
+    if cached is None:
+        query_embedding = _embed_question(question)
+        if query_embedding is not None:
+            cached = answer_cache.get_similar(scope, query_embedding)
+    if cached is not None:
+        return _from_cache(question, cached)
+    return _context_for_embedding(db, project, question, query_embedding, search_mode), None
+
+
+async def prepare_answer_async(
+    db: AsyncSession, project: Project, question: str, search_mode: str | None = None
+) -> Tuple[AnswerContext, str | None]:
+    scope = _cache_scope(project, search_mode)
+    cached = answer_cache.get(scope, question)
+    if cached is None:
+        query_embedding = await _embed_question_async(question)
+        if query_embedding is not None:
+            cached = answer_cache.get_similar(scope, query_embedding)
+    if cached is not None:
+        return _from_cache(question, cached)
+    context = await _context_for_embedding_async(project, question, query_embedding, search_mode)
+    return context, None
+
+
+def remember_answer(
+    project: Project, context: AnswerContext, answer: str, search_mode: str | None = None
+) -> None:
+    # Fallback answers aren't cached; the next request may reach the provider.
+    if context.cached or context.degraded or not context.has_sources:
+        return
+    answer_cache.put(
+        _cache_scope(project, search_mode),
+        context.question,
+        context.query_embedding,
+        (replace(context, query_embedding=None), answer),
+    )
+
+
+def _local_answer(context: AnswerContext) -> str:
+    if not context.has_sources:
+        return NO_ANSWER
+    return _fallback_answer(context.question, context.prompt_chunks)
+
+
+def _use_fallback(context: AnswerContext, exc: Exception) -> bool:
+    if not provider_unavailable(exc):
+        return False
+    # The breaker logs when it opens; one warning per rejected call would flood.
+    log = logger.debug if isinstance(exc, CircuitOpenError) else logger.warning
+    log("LLM provider unavailable (%s); answering from the top source", exc)
+    context.degraded = True
+    return True
+
+
+def _use_llm(context: AnswerContext) -> bool:
+    return context.has_sources and bool(settings.openai_api_key)
+
+
+def generate_answer(context: AnswerContext) -> str:
+    if _use_llm(context):
+        try:
+            return _llm_answer(context)
+        except Exception as exc:
+            if not _use_fallback(context, exc):
+                raise
+    return _local_answer(context)
+
+
+# Falls back only if the provider fails before the first token.
+def stream_answer(context: AnswerContext) -> Iterator[str]:
+    if _use_llm(context):
+        started = False
+        try:
+            for token in _llm_stream(context):
+                started = True
+                yield token
+            return
+        except Exception as exc:
+            if started or not _use_fallback(context, exc):
+                raise
+    yield _local_answer(context)
+
+
+async def generate_answer_async(context: AnswerContext) -> str:
+    if _use_llm(context):
+        try:
+            return await _llm_answer_async(context)
+        except Exception as exc:
+            if not _use_fallback(context, exc):
+                raise
+    return _local_answer(context)
+
+
+async def stream_answer_async(context: AnswerContext) -> AsyncIterator[str]:
+    if _use_llm(context):
+        started = False
+        try:
+            async for token in _llm_stream_async(context):
+                started = True
+                yield token
+            return
+        except Exception as exc:
+            if started or not _use_fallback(context, exc):
+                raise
+    yield _local_answer(context)
+
+
+def _add_exchange(
+    db: Session | AsyncSession, project: Project, user_id: int, context: AnswerContext, answer: str
+) -> None:
     db.add(
         ChatMessage(
             project_id=project.id,
             user_id=user_id,
             role="user",
-            content=question,
+            content=context.question,
             sources_json=None,
         )
     )
@@ -130,10 +398,47 @@ def answer_question(
             user_id=user_id,
             role="assistant",
             content=answer,
-            sources_json=[c.dict() for c in citations],
+            sources_json=[c.dict() for c in context.citations],
         )
     )
     project.last_activity_at = datetime.utcnow()
-    db.commit()
 
-    return answer, citations, used_chunks
+
+def record_exchange(
+    db: Session, project: Project, user_id: int, context: AnswerContext, answer: str
+) -> None:
+    _add_exchange(db, project, user_id, context, answer)
+    with timer(RAG_STAGE_SECONDS, "commit"):
+        db.commit()
+
+
+async def record_exchange_async(
+    db: AsyncSession, project: Project, user_id: int, context: AnswerContext, answer: str
+) -> None:
+    _add_exchange(db, project, user_id, context, answer)
+    with timer(RAG_STAGE_SECONDS, "commit"):
+        await db.commit()
+
+
+def answer_question(
+    db: Session, project: Project, user_id: int, question: str, search_mode: str | None = None
+) -> tuple[str, AnswerContext]:
+    context, answer = prepare_answer(db, project, question, search_mode)
+    if answer is None:
+        answer = generate_answer(context)
+        remember_answer(project, context, answer, search_mode)
+    if context.has_sources:
+        record_exchange(db, project, user_id, context, answer)
+    return answer, context
+
+
+async def answer_question_async(
+    db: AsyncSession, project: Project, user_id: int, question: str, search_mode: str | None = None
+) -> tuple[str, AnswerContext]:
+    context, answer = await prepare_answer_async(db, project, question, search_mode)
+    if answer is None:
+        answer = await generate_answer_async(context)
+        remember_answer(project, context, answer, search_mode)
+    if context.has_sources:
+        await record_exchange_async(db, project, user_id, context, answer)
+    return answer, context
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+from sqlalchemy import Text, cast, func, select
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import TEXT_SEARCH_CONFIG, Document, DocumentChunk, Project
+from app.services.embedding_codec import decode_matrix, encode_embedding
+from app.services.index_cache import (
+    get_project_index,
+    index_cache,
+    legacy_vector_filters,
+    vector_filters,
+)
+from app.services.vector_store import search
+
+
+# Per-row overhead of a cached index beyond the vector itself (ids + lists).
+INDEX_ROW_OVERHEAD = 24
+# Reciprocal-rank fusion constant; damps the weight of the very top ranks.
+RRF_K = 60
+
+
+class SearchHit(NamedTuple):
+    chunk_id: int
+    score: float
+    # The chunk contains every term of the question.
+    lexical: bool = False
+
+
+def _iter_vector_batches(
+    db: Session, project_id: int, dim: int, batch_size: int, *filters
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    stmt = (
+        select(DocumentChunk.id, DocumentChunk.embedding_vector)
+        .where(*vector_filters(project_id), DocumentChunk.embedding_dim == dim, *filters)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in db.execute(stmt).partitions():
+        ids = np.fromiter((row[0] for row in partition), dtype=np.int64, count=len(partition))
+        yield ids, decode_matrix([row[1] for row in partition], dim)
+
+    legacy_stmt = (
+        select(DocumentChunk.id, DocumentChunk.embedding)
+        .where(*legacy_vector_filters(project_id), *filters)
+        .execution_options(yield_per=batch_size)
+    )
+    for partition in db.execute(legacy_stmt).partitions():
+        encoded = [(row[0], encode_embedding(row[1], None)) for row in partition]
+        encoded = [(chunk_id, item) for chunk_id, item in encoded if item["embedding_dim"] == dim]
+        if encoded:
+            ids = np.fromiter((chunk_id for chunk_id, _ in encoded), dtype=np.int64, count=len(encoded))
+            yield ids, decode_matrix([item["embedding_vector"] for _, item in encoded], dim)
+
+
+def stream_search(
+    db: Session, project_id: int, query: List[float], k: int, batch_size: int | None = None
+) -> List[Tuple[int, float]]:
+    heap: List[Tuple[float, int]] = []
+    batches = _iter_vector_batches(db, project_id, len(query), batch_size or settings.retrieval_batch_size)
+    for ids, matrix in batches:
+        positions, scores = search(matrix, query, k)
+        for chunk_id, score in zip(ids[positions].tolist(), scores.tolist()):
+            if len(heap) < k:
+                heapq.heappush(heap, (score, chunk_id))
+            elif score > heap[0][0]:
+                heapq.heapreplace(heap, (score, chunk_id))
+    return [(chunk_id, score) for score, chunk_id in sorted(heap, reverse=True)]
+
+
+def _fits_in_cache(db: Session, project_id: int, dim: int) -> bool:
+    rows = db.query(func.count(DocumentChunk.id)).filter(DocumentChunk.project_id == project_id).scalar()
+    return rows * (dim * 4 + INDEX_ROW_OVERHEAD) <= index_cache.max_bytes
+
+
+def retrieve(db: Session, project: Project, query: List[float], k: int) -> List[Tuple[int, float]]:
+    mode = settings.retrieval_mode
+    if mode == "auto":
+        warm = index_cache.get(project.id) is not None
+        mode = "index" if warm or _fits_in_cache(db, project.id, len(query)) else "stream"
+    if mode == "stream":
+        return stream_search(db, project.id, query, k)
+
+    index = get_project_index(db, project)
+    if not len(index) or index.dim != len(query):
+        return []
+    positions, scores = index.search(query, k)
+    return list(zip(index.chunk_ids[positions].tolist(), scores.tolist()))
+
+
+# Returns (chunk_id, rank, matches_all_terms).
+def lexical_search(
+    db: Session, project_id: int, question: str, limit: int
+) -> List[Tuple[int, float, bool]]:
+    # plainto_tsquery ANDs every term; OR-ing them lets a question match chunks
+    # that contain only its keywords, and ranking puts fuller matches first.
+    all_terms = func.plainto_tsquery(TEXT_SEARCH_CONFIG, question)
+    query = cast(func.replace(cast(all_terms, Text), "&", "|"), TSQUERY)
+    rank = func.ts_rank_cd(DocumentChunk.content_tsv, query)
+    stmt = (
+        select(DocumentChunk.id, rank, DocumentChunk.content_tsv.op("@@")(all_terms))
+        .where(DocumentChunk.project_id == project_id, DocumentChunk.content_tsv.op("@@")(query))
+        .order_by(rank.desc(), DocumentChunk.id)
+        .limit(limit)
+    )
+    return [(chunk_id, float(score), bool(full)) for chunk_id, score, full in db.execute(stmt)]
+
+
+def score_chunks(
+    db: Session, project_id: int, query: List[float], chunk_ids: List[int]
+) -> List[Tuple[int, float]]:
+    if not chunk_ids:
+        return []
+    scored: List[Tuple[int, float]] = []
+    batches = _iter_vector_batches(
+        db, project_id, len(query), len(chunk_ids), DocumentChunk.id.in_(chunk_ids)
+    )
+    for ids, matrix in batches:
+        positions, scores = search(matrix, query, len(ids))
+        scored.extend(zip(ids[positions].tolist(), scores.tolist()))
+    return sorted(scored, key=lambda item: item[1], reverse=True)
+
+
+# Unit vectors for the given chunks, from the cached project index when it
+# holds all of them and from the database otherwise.
+def chunk_vectors(
+    db: Session, project_id: int, dim: int, chunk_ids: List[int]
+) -> Dict[int, np.ndarray]:
+    index = index_cache.get(project_id)
+    if index is not None and index.dim == dim:
+        positions = np.flatnonzero(np.isin(index.chunk_ids, chunk_ids))
+        if len(positions) == len(set(chunk_ids)):
+            return dict(zip(index.chunk_ids[positions].tolist(), index.matrix[positions]))
+    vectors: Dict[int, np.ndarray] = {}
+    batches = _iter_vector_batches(db, project_id, dim, len(chunk_ids), DocumentChunk.id.in_(chunk_ids))
+    for ids, matrix in batches:
+        vectors.update(zip(ids.tolist(), matrix))
+    return vectors
+
+
+def _fuse(rankings: List[List[int]]) -> List[int]:
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+# dense scores every chunk; prefilter scores only the lexical candidates;
+# hybrid fuses the dense and lexical rankings. Scores are cosine similarities,
+# and hits that contain every term of the question are flagged. Without a
+# query embedding only full-text ranks are available.
+def search_chunks(
+    db: Session, project: Project, question: str, query: List[float] | None, k: int, mode: str | None = None
+) -> List[SearchHit]:
+    if query is None:
+        return [SearchHit(*match) for match in lexical_search(db, project.id, question, k)]
+    mode = mode or settings.search_mode
+    if mode == "dense":
+        return [SearchHit(chunk_id, score) for chunk_id, score in retrieve(db, project, query, k)]
+
+    candidates = settings.search_candidates
+    matches = lexical_search(db, project.id, question, candidates)
+    if not matches:
+        return search_chunks(db, project, question, query, k, "dense")
+    lexical_ids = [chunk_id for chunk_id, _, _ in matches]
+    matched = {chunk_id for chunk_id, _, full in matches if full}
+    if mode == "prefilter":
+        scored = score_chunks(db, project.id, query, lexical_ids)[:k]
+        return [SearchHit(chunk_id, score, chunk_id in matched) for chunk_id, score in scored]
+
+    dense = retrieve(db, project, query, candidates)
+    top_ids = _fuse([[chunk_id for chunk_id, _ in dense], lexical_ids])[:k]
+    scores = dict(dense)
+    missing = [chunk_id for chunk_id in top_ids if chunk_id not in scores]
+    scores.update(score_chunks(db, project.id, query, missing))
+    return [
+        SearchHit(chunk_id, scores[chunk_id], chunk_id in matched)
+        for chunk_id in top_ids
+        if chunk_id in scores
+    ]
+
+
+def load_chunks(db: Session, chunk_ids: List[int]) -> dict[int, Tuple[DocumentChunk, Document]]:
+    if not chunk_ids:
+        return {}
+    rows = (
+        db.query(DocumentChunk, Document)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .filter(DocumentChunk.id.in_(chunk_ids))
+        .all()
+    )
+    return {chunk.id: (chunk, document) for chunk, document in rows}
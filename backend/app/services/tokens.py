@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict
+
+import tiktoken
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "o200k_base"
+# Used only when the tokenizer files can't be loaded (e.g. offline hosts).
+CHARS_PER_TOKEN = 4
+
+_encodings: Dict[str, tiktoken.Encoding | None] = {}
+_loaders: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+
+
+def _load(model: str) -> None:
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as exc:
+        logger.warning("Tokenizer for %s unavailable (%s); estimating token counts", model, exc)
+        encoding = None
+    _encodings[model] = encoding
+
+
+def _start_load(model: str) -> threading.Thread | None:
+    with _lock:
+        if model in _loaders:
+            return None
+        loader = _loaders[model] = threading.Thread(target=_load, args=(model,), daemon=True)
+    loader.start()
+    return loader
+
+
+# tiktoken downloads its BPE files on first use, without a timeout. They load
+# in a background thread; only the call that starts the load waits for it,
+# up to TOKENIZER_LOAD_TIMEOUT_SECONDS, and counts are estimated until then.
+def _encoding(model: str) -> tiktoken.Encoding | None:
+    if model not in _encodings:
+        loader = _start_load(model)
+        if loader is not None:
+            loader.join(settings.tokenizer_load_timeout_seconds)
+    return _encodings.get(model)
+
+
+# Called at startup so the first questions don't wait for the download.
+def preload_tokenizer() -> None:
+    _start_load(settings.openai_model)
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    encoding = _encoding(model or settings.openai_model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, limit: int, model: str | None = None) -> str:
+    encoding = _encoding(model or settings.openai_model)
+    if encoding is None:
+        return text[: limit * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= limit else encoding.decode(tokens[:limit])
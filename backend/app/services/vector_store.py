@@ -1,20 +1,128 @@
+from __future__ import annotations
+
 from typing import List, Tuple
 
 import numpy as np
 
+from app.services.metrics import CHUNKS_SCORED
+
 
-def cosine_similarity(query: List[float], vectors: List[List[float]]) -> List[float]:
-    if not vectors:
+def cosine_similarity(
+    query: List[float], vectors: List[List[float]] | np.ndarray, normalized: bool = False
+) -> List[float]:
+    if not len(vectors):
         return []
     query_vec = np.array(query, dtype=float)
     query_vec = query_vec / (np.linalg.norm(query_vec) + 1e-8)
-    matrix = np.array(vectors, dtype=float)
-    matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8)
+    matrix = np.asarray(vectors, dtype=float)
+    if not normalized:
+        matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8)
     return (matrix @ query_vec).tolist()
 
 
+def _top_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    positions = np.argpartition(-scores, k - 1)[:k]
+    return positions[np.argsort(-scores[positions])]
+
+
 def top_k(similarities: List[float], k: int) -> List[int]:
-    if not similarities:
+    if not len(similarities):
         return []
-    indices = np.argsort(similarities)[::-1][:k]
-    return indices.astype(int).tolist()
+    return _top_positions(np.asarray(similarities), k).astype(int).tolist()
+
+
+def _unit_query(query: List[float] | np.ndarray) -> np.ndarray:
+    query_vec = np.asarray(query, dtype=np.float32)
+    return query_vec / (np.linalg.norm(query_vec) + 1e-8)
+
+
+def search(matrix: np.ndarray, query: List[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if not len(matrix) or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    scores = matrix @ _unit_query(query)
+    CHUNKS_SCORED.inc(len(matrix))
+    positions = _top_positions(scores, k)
+    return positions, scores[positions]
+
+
+def _spherical_kmeans(
+    sample: np.ndarray, n_lists: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        centroids[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        # Reseed empty lists from random points so every list stays usable.
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-8
+    return centroids
+
+
+# Inverted lists hold row positions into a unit-norm matrix owned by the
+# caller. Instances are never mutated: extended() returns a new index, so a
+# concurrent search can't see positions past the end of its own matrix.
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, lists: List[np.ndarray], trained_size: int) -> None:
+        self.centroids = centroids
+        self.lists = lists
+        self.trained_size = trained_size
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        n_lists: int = 0,
+        iterations: int = 10,
+        sample_size: int = 0,
+        seed: int = 0,
+    ) -> IVFIndex:
+        n_lists = min(n_lists or max(1, int(np.sqrt(len(matrix)))), len(matrix))
+        sample_size = min(len(matrix), sample_size or n_lists * 64)
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(len(matrix), size=sample_size, replace=False))]
+        centroids = _spherical_kmeans(sample, n_lists, iterations, rng)
+        lists = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        index = cls(centroids, lists, trained_size=len(matrix))
+        return index.extended(np.arange(len(matrix), dtype=np.int64), matrix)
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + sum(lst.nbytes for lst in self.lists)
+
+    def assign(self, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start : start + batch_size]
+            labels[start : start + batch_size] = np.argmax(batch @ self.centroids.T, axis=1)
+        return labels
+
+    def extended(self, positions: np.ndarray, vectors: np.ndarray) -> IVFIndex:
+        lists = list(self.lists)
+        labels = self.assign(vectors)
+        counts = np.bincount(labels, minlength=len(lists))
+        groups = np.split(positions[np.argsort(labels, kind="stable")], np.cumsum(counts)[:-1])
+        for label in np.flatnonzero(counts):
+            lists[label] = np.concatenate((lists[label], groups[label]))
+        return IVFIndex(self.centroids, lists, self.trained_size)
+
+    def search(
+        self, matrix: np.ndarray, query: List[float], k: int, nprobe: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        query_vec = _unit_query(query)
+        probes = _top_positions(self.centroids @ query_vec, max(nprobe, 1))
+        candidates = np.concatenate([self.lists[probe] for probe in probes])
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = matrix[candidates] @ query_vec
+        CHUNKS_SCORED.inc(len(candidates))
+        best = _top_positions(scores, k)
+        return candidates[best], scores[best]
@@ -1,9 +1,12 @@
+import hashlib
 import os
+import tempfile
 from pathlib import Path
-from typing import BinaryIO
+from typing import BinaryIO, Tuple
 
 
 BASE_STORAGE = Path(os.getenv("STORAGE_DIR", "storage"))
+BLOCK_SIZE = 1024 * 1024
 
 
 def ensure_storage() -> Path:
@@ -11,10 +14,25 @@ def ensure_storage() -> Path:
     return BASE_STORAGE
 
 
-def save_upload(file_obj: BinaryIO, filename: str) -> Path:
+def content_path(content_hash: str, suffix: str = "") -> Path:
+    return BASE_STORAGE / "objects" / content_hash[:2] / content_hash[2:4] / f"{content_hash}{suffix}"
+
+
+def save_upload(file_obj: BinaryIO, filename: str) -> Tuple[Path, str]:
     ensure_storage()
-    safe_name = filename.replace(" ", "_")
-    path = BASE_STORAGE / safe_name
-    with path.open("wb") as f:
-        f.write(file_obj.read())
-    return path
+    digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(dir=BASE_STORAGE, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while block := file_obj.read(BLOCK_SIZE):
+                digest.update(block)
+                f.write(block)
+        content_hash = digest.hexdigest()
+        path = content_path(content_hash, Path(filename).suffix.lower())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Same hash means same bytes, so replacing an existing copy is harmless.
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return path, content_hash
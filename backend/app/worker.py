@@ -0,0 +1,199 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import settings
+from app.db import Base, SessionLocal, engine
+from app.migrations import upgrade_schema
+from app.models import IngestionJob
+from app.services.crawler import run_crawl_job
+from app.services.ingestion import ingest_document, refresh_document
+from app.services.jobs import (
+    PermanentJobError,
+    claim_jobs,
+    complete_job,
+    fail_job,
+    heartbeat,
+    schedule_url_refreshes,
+)
+from app.services.metrics import INGESTION_STAGE_SECONDS, render
+
+
+logger = logging.getLogger(__name__)
+
+REFRESH_CHECK_SECONDS = 60
+
+
+def _init_process() -> None:
+    # Ctrl-C reaches the whole process group; only the parent should react.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# Returns the job's ingestion stage timings, which only the parent exports.
+def run_job(job_id: int) -> dict:
+    with SessionLocal() as db:
+        job = db.get(IngestionJob, job_id)
+        if job.kind == "refresh":
+            refresh_document(db, job.document_id)
+        elif job.kind == "crawl":
+            run_crawl_job(db, job_id)
+        else:
+            ingest_document(db, job.document_id, (job.payload or {}).get("source_path"))
+    return INGESTION_STAGE_SECONDS.take()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class IngestionWorker:
+    def __init__(self, concurrency: int, poll_seconds: float) -> None:
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.in_flight: dict[Future, int] = {}
+        self.stopping = False
+        self._last_heartbeat = 0.0
+        self._last_refresh_check = 0.0
+
+    def stop(self, *_args) -> None:
+        logger.info("Stopping after %s in-flight jobs", len(self.in_flight))
+        self.stopping = True
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn gives children fresh engines instead of inherited sockets.
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+        )
+
+    def run(self) -> None:
+        pool = self._new_pool()
+        try:
+            while not self.stopping or self.in_flight:
+                if not self.stopping:
+                    self._schedule_refreshes()
+                    self._claim(pool)
+                self._heartbeat()
+                if not self.in_flight:
+                    time.sleep(self.poll_seconds)
+                    continue
+                done, _ = wait(self.in_flight, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                if self._finish(done):
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._new_pool()
+        finally:
+            pool.shutdown(wait=True)
+
+    def _claim(self, pool: ProcessPoolExecutor) -> None:
+        free = self.concurrency - len(self.in_flight)
+        if free <= 0:
+            return
+        with SessionLocal() as db:
+            job_ids = claim_jobs(db, self.worker_id, free)
+        for job_id in job_ids:
+            logger.info("Claimed ingestion job %s", job_id)
+            self.in_flight[pool.submit(run_job, job_id)] = job_id
+
+    def _schedule_refreshes(self) -> None:
+        now = time.monotonic()
+        if now - self._last_refresh_check < REFRESH_CHECK_SECONDS:
+            return
+        self._last_refresh_check = now
+        with SessionLocal() as db:
+            schedule_url_refreshes(db)
+
+    def _heartbeat(self) -> None:
+        now = time.monotonic()
+        if now - self._last_heartbeat < settings.ingestion_lease_seconds / 3:
+            return
+        self._last_heartbeat = now
+        with SessionLocal() as db:
+            heartbeat(db, self.worker_id, list(self.in_flight.values()))
+
+    def _finish(self, done: set) -> bool:
+        broken = False
+        with SessionLocal() as db:
+            for future in done:
+                job_id = self.in_flight.pop(future)
+                try:
+                    INGESTION_STAGE_SECONDS.merge(future.result())
+                except BrokenProcessPool as exc:
+                    broken = True
+                    fail_job(db, job_id, f"Worker process died: {exc}")
+                except PermanentJobError as exc:
+                    fail_job(db, job_id, str(exc), retry=False)
+                except Exception as exc:
+                    logger.exception("Job %s failed", job_id)
+                    fail_job(db, job_id, str(exc) or exc.__class__.__name__)
+                else:
+                    complete_job(db, job_id)
+            if broken:
+                # Every job still queued on the dead pool has to be retried.
+                for job_id in self.in_flight.values():
+                    fail_job(db, job_id, "Worker process pool restarted")
+                self.in_flight.clear()
+        return broken
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Process queued document ingestion jobs.")
+    parser.add_argument("--concurrency", type=int, default=settings.ingestion_workers)
+    parser.add_argument("--poll-seconds", type=float, default=settings.ingestion_poll_seconds)
+    parser.add_argument(
+        "--schedule-refreshes", action="store_true", help="queue due URL refreshes and exit"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=settings.worker_metrics_port,
+        help="serve Prometheus metrics on this port (0 = off)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    if args.schedule_refreshes:
+        with SessionLocal() as db:
+            schedule_url_refreshes(db)
+        return
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    worker = IngestionWorker(args.concurrency, args.poll_seconds)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    logger.info("Ingestion worker %s running %s processes", worker.worker_id, args.concurrency)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
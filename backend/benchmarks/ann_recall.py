@@ -0,0 +1,99 @@
+"""Recall@k and latency of the IVF index against exact search.
+
+The corpus is synthetic text embedded with the local hashing embedder: each
+chunk mixes common Zipf-distributed words with the vocabulary of one of
+--topics topics. Queries are short excerpts of held-out chunks that are not in
+the index, as questions are, so recall reflects retrieval rather than
+near-duplicate lookup. --corpus mixture uses a Gaussian mixture instead, with
+--spread setting how far points lie from their cluster centre.
+Run from backend/: python -m benchmarks.ann_recall --vectors 40000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.local_embeddings import HashingEmbedder
+from app.services.vector_store import IVFIndex, search
+
+
+def _vocabulary(rng: np.random.Generator, size: int) -> np.ndarray:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    return np.array(["".join(rng.choice(letters, size=rng.integers(3, 10))) for _ in range(size)])
+
+
+def text_corpus(n: int, queries: int, dim: int, topics: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    common = _vocabulary(rng, 5000)
+    weights = 1.0 / np.arange(1, len(common) + 1)
+    weights /= weights.sum()
+    topic_words = _vocabulary(rng, topics * 200).reshape(topics, 200)
+    labels = rng.integers(0, topics, size=n + queries)
+    texts = []
+    for label in labels:
+        words = np.concatenate((rng.choice(common, size=60, p=weights), rng.choice(topic_words[label], size=60)))
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    # Held-out chunks are queried by an excerpt of about a question's length.
+    held_out = []
+    for text in texts[n:]:
+        words = text.split()
+        start = rng.integers(0, len(words) - 12)
+        held_out.append(" ".join(words[start : start + 12]))
+    embedder = HashingEmbedder(dim)
+    matrix = np.concatenate([embedder.embed_matrix(texts[i : min(i + 10000, n)]) for i in range(0, n, 10000)])
+    return matrix, embedder.embed_matrix(held_out)
+
+
+def mixture_corpus(
+    n: int, queries: int, dim: int, clusters: int, spread: float, seed: int
+) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n + queries)
+    points = centers[labels] + rng.normal(scale=spread, size=(n + queries, dim)).astype(np.float32)
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points[:n], points[n:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", choices=["text", "mixture"], default="text")
+    parser.add_argument("--vectors", type=int, default=40000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--lists", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 32, 64, 128])
+    args = parser.parse_args()
+
+    if args.corpus == "text":
+        matrix, queries = text_corpus(args.vectors, args.queries, args.dim, args.topics, seed=0)
+    else:
+        matrix, queries = mixture_corpus(
+            args.vectors, args.queries, args.dim, args.clusters, args.spread, seed=0
+        )
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    started = time.perf_counter()
+    index = IVFIndex.train(matrix, n_lists=args.lists)
+    print(f"trained {len(index.lists)} lists over {len(matrix)} vectors in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    truth = [set(search(matrix, query, args.k)[0].tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    print(f"exact        recall@{args.k}=1.000  {exact_ms:7.3f} ms/query")
+
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        found = [set(index.search(matrix, query, args.k, nprobe)[0].tolist()) for query in queries]
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"nprobe={nprobe:<5} recall@{args.k}={recall:.3f}  {elapsed_ms:7.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Chat history latency vs history length: full list vs keyset pages.
+
+Runs against DATABASE_URL inside a transaction that is rolled back.
+Run from backend/: python -m benchmarks.chat_history --messages 1000 100000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text
+
+from app.db import Base, SessionLocal, engine
+from app.migrations import upgrade_schema
+from app.models import ChatMessage, Project, User
+from app.routers.chat import HISTORY_PAGE_SIZE, history_statement
+
+
+def timed(db, stmt, repeats: int) -> tuple[float, int]:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        rows = db.execute(stmt).all()
+    return (time.perf_counter() - started) / repeats * 1000, len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 20000, 100000])
+    parser.add_argument("--sources", type=int, default=8, help="citations per assistant message")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    citation = {"document_id": 1, "document_name": "paper.pdf", "page_number": 3, "snippet": "x" * 400}
+    for count in args.messages:
+        with SessionLocal() as db:
+            user = User(email="benchmark@example.com", password_hash="-")
+            db.add(user)
+            db.flush()
+            # A second project's messages share the table, as in production.
+            projects = [Project(user_id=user.id, name="benchmark"), Project(user_id=user.id, name="other")]
+            db.add_all(projects)
+            db.flush()
+            start = datetime(2024, 1, 1)
+            for project in projects:
+                rows = [
+                    {
+                        "project_id": project.id,
+                        "user_id": user.id,
+                        "role": "assistant" if idx % 2 else "user",
+                        "content": f"message {idx} " + "y" * 300,
+                        "sources_json": [citation] * args.sources if idx % 2 else None,
+                        "created_at": start + timedelta(seconds=idx),
+                    }
+                    for idx in range(count)
+                ]
+                for offset in range(0, count, 5000):
+                    db.execute(insert(ChatMessage), rows[offset : offset + 5000])
+            db.execute(text("ANALYZE chat_messages"))
+            project_id = projects[0].id
+
+            full = (
+                select(ChatMessage)
+                .where(ChatMessage.project_id == project_id)
+                .order_by(ChatMessage.created_at.asc())
+            )
+            middle = (start + timedelta(seconds=count // 2), 0)
+            cases = (
+                ("full history", full),
+                ("latest page", history_statement(project_id, None, HISTORY_PAGE_SIZE, True)),
+                ("middle page", history_statement(project_id, middle, HISTORY_PAGE_SIZE, True)),
+                ("latest, no sources", history_statement(project_id, None, HISTORY_PAGE_SIZE, False)),
+            )
+            for name, stmt in cases:
+                elapsed, rows = timed(db, stmt, args.repeats)
+                print(f"messages={count:<7} {name:<19} {elapsed:9.2f} ms  {rows} rows")
+            db.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Chunk persistence rows/sec: ORM unit-of-work loop vs batched INSERT vs COPY.
+
+Runs against DATABASE_URL inside a transaction that is rolled back.
+Run from backend/: python -m benchmarks.chunk_persistence --rows 20000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.db import Base, SessionLocal, engine
+from app.migrations import upgrade_schema
+from app.models import Document, DocumentChunk, Project, User
+from app.services.chunk_writer import chunk_rows, copy_chunk_rows, insert_chunk_rows
+from app.services.embedding_codec import encode_embedding
+
+
+def orm_loop(db, project_id: int, document_id: int, chunks: list[dict]) -> None:
+    for chunk in chunks:
+        db.add(
+            DocumentChunk(
+                document_id=document_id,
+                project_id=project_id,
+                content=chunk["content"],
+                page_number=chunk["page_number"],
+                **encode_embedding(chunk["embedding"], chunk["embedding_model"]),
+            )
+        )
+    db.flush()
+
+
+def bulk_insert(db, project_id: int, document_id: int, chunks: list[dict]) -> None:
+    insert_chunk_rows(db, chunk_rows(project_id, document_id, chunks))
+
+
+def copy(db, project_id: int, document_id: int, chunks: list[dict]) -> None:
+    copy_chunk_rows(db, chunk_rows(project_id, document_id, chunks))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    parser.add_argument("--batch-size", type=int, default=settings.chunk_insert_batch_size)
+    args = parser.parse_args()
+    settings.chunk_insert_batch_size = args.batch_size
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    rng = np.random.default_rng(0)
+    for count in args.rows:
+        vectors = rng.normal(size=(count, args.dims)).astype(np.float32)
+        chunks = [
+            {
+                "content": f"chunk {idx} " + "x" * args.chunk_chars,
+                "page_number": idx // 4 + 1,
+                "embedding": vectors[idx],
+                "embedding_model": "benchmark",
+            }
+            for idx in range(count)
+        ]
+        for name, write in (("orm loop", orm_loop), ("batched insert", bulk_insert), ("copy", copy)):
+            with SessionLocal() as db:
+                user = User(email="benchmark@example.com", password_hash="-")
+                db.add(user)
+                db.flush()
+                project = Project(user_id=user.id, name="benchmark")
+                db.add(project)
+                db.flush()
+                document = Document(project_id=project.id, name="benchmark", doc_type="text")
+                db.add(document)
+                db.flush()
+                started = time.perf_counter()
+                write(db, project.id, document.id, chunks)
+                db.flush()
+                elapsed = time.perf_counter() - started
+                db.rollback()
+            print(f"rows={count:<7} {name:<15} {count / elapsed:10.1f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
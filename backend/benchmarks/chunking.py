@@ -0,0 +1,85 @@
+"""Chunking throughput and quality: fixed character windows vs the structure-aware chunker.
+
+Pages hold sentences, markdown headings, and short page tails. Throughput is
+timed over pre-generated pages; peak memory is traced on a second pass that
+streams pages from a generator, as ingestion does.
+Run from backend/: python -m benchmarks.chunking --pages 2000 10000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Iterable, Iterator, Tuple
+
+from app.services.chunker import CHUNK_OVERLAP, CHUNK_SIZE, MIN_CHUNK_CHARS, chunk_pages
+
+WORDS = (
+    "the index stores embeddings for every chunk while the worker refreshes stale documents "
+    "and retrieval ranks candidates by cosine similarity before the prompt is packed"
+).split()
+
+
+def generate_pages(count: int, seed: int = 0) -> Iterator[Tuple[int, str]]:
+    rng = random.Random(seed)
+    for page_number in range(1, count + 1):
+        blocks = []
+        # Every fifth page ends early, like the last page of a section.
+        for _ in range(rng.randint(1, 2) if page_number % 5 == 0 else rng.randint(4, 8)):
+            if rng.random() < 0.3:
+                blocks.append(f"## Section {page_number}.{len(blocks)}")
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 28))).capitalize() + "."
+                for _ in range(rng.randint(1, 6))
+            ]
+            blocks.append(" ".join(sentences))
+        yield page_number, "\n\n".join(blocks)
+
+
+# The previous fixed-window chunker, kept here as the baseline.
+def window_chunks(pages: Iterable[Tuple[int, str]]) -> Iterator[dict]:
+    for page_number, text in pages:
+        cleaned = " ".join(text.split())
+        start = 0
+        while start < len(cleaned):
+            end = min(len(cleaned), start + CHUNK_SIZE)
+            yield {"content": cleaned[start:end], "page_number": page_number}
+            if end == len(cleaned):
+                break
+            start = end - CHUNK_OVERLAP
+
+
+def cut_mid_sentence(chunk: dict) -> bool:
+    return chunk["content"].rstrip()[-1:] not in (".", "!", "?")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2000, 10000])
+    args = parser.parse_args()
+
+    for pages in args.pages:
+        page_list = list(generate_pages(pages))
+        for name, chunker in (("fixed windows", window_chunks), ("structure-aware", chunk_pages)):
+            started = time.perf_counter()
+            chunks = tiny = broken = chars = 0
+            for chunk in chunker(page_list):
+                chunks += 1
+                chars += len(chunk["content"])
+                tiny += len(chunk["content"]) < MIN_CHUNK_CHARS
+                broken += cut_mid_sentence(chunk)
+            elapsed = time.perf_counter() - started
+
+            tracemalloc.start()
+            for _ in chunker(generate_pages(pages)):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(
+                f"pages={pages:<6} {name:<16} {chunks / elapsed:9.0f} chunks/s  {chunks:6} chunks  "
+                f"avg {chars / chunks:4.0f} chars  {tiny:5} under {MIN_CHUNK_CHARS}  "
+                f"{broken:5} cut mid-sentence  peak {peak / 1024:6.0f} KiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
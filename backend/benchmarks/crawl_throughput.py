@@ -0,0 +1,53 @@
+"""Crawl pages/sec against the local fake site, serial vs concurrent fetching.
+
+Run from backend/: python -m benchmarks.crawl_throughput --pages 1000 --latency-ms 40
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.services.crawler import crawl, sitemap_urls
+from benchmarks.fake_site import FakeSite
+
+
+async def run(site: FakeSite, concurrency: int, per_host: int, host_delay: float) -> tuple[int, int, float]:
+    fetched = failed = 0
+
+    async def on_result(result) -> None:
+        nonlocal fetched, failed
+        if result.page is None:
+            failed += 1
+        else:
+            fetched += 1
+
+    site.peak_active = 0
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency)) as client:
+        urls = await sitemap_urls(client, site.sitemap_url, limit=site.pages)
+        started = time.perf_counter()
+        await crawl(urls, on_result, client, concurrency=concurrency, per_host=per_host, host_delay=host_delay)
+        elapsed = time.perf_counter() - started
+    assert fetched + failed == len(urls)
+    return fetched, failed, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--per-host", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--host-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    site = FakeSite(pages=args.pages, latency_ms=args.latency_ms).start()
+    for per_host in args.per_host:
+        fetched, failed, elapsed = asyncio.run(run(site, 64, per_host, args.host_delay))
+        print(
+            f"per_host={per_host:<3} {fetched / elapsed:9.1f} pages/s  fetched={fetched} "
+            f"failed={failed} peak_concurrency={site.peak_active}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Embedding throughput (chunks/sec) per document size against a local fake server.
+
+Run from backend/: python -m benchmarks.embedding_throughput --error-rate 0.05
+"""
+import argparse
+import time
+
+from app.config import settings
+from app.services.embeddings import embed_texts
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        dims=args.dims, latency_ms=args.latency_ms, error_rate=args.error_rate
+    ).start()
+    settings.openai_api_key = "benchmark"
+    settings.openai_base_url = server.base_url
+
+    for concurrency in args.concurrency:
+        settings.embedding_concurrency = concurrency
+        for count in args.chunks:
+            texts = [f"chunk {idx} " + "x" * args.chunk_chars for idx in range(count)]
+            requests_before = server.requests
+            started = time.perf_counter()
+            vectors = embed_texts(texts, use_cache=False)
+            elapsed = time.perf_counter() - started
+            assert len(vectors) == count
+            print(
+                f"concurrency={concurrency:<3} chunks={count:<6} "
+                f"{count / elapsed:9.1f} chunks/s  requests={server.requests - requests_before}"
+            )
+    print(f"max batch size seen by server: {server.max_batch}, injected errors: {server.errors}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
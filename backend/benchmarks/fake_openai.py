@@ -0,0 +1,159 @@
+"""Local stand-in for the OpenAI embeddings and chat completions endpoints.
+
+Returns deterministic vectors (and a canned, optionally streamed, answer)
+after a configurable latency and can inject 429/5xx responses, so batching,
+streaming, retries and circuit breaking can be exercised offline. Connections
+are kept alive and counted, to check client connection reuse:
+
+    python -m benchmarks.fake_openai --port 8089 --latency-ms 80 --error-rate 0.05
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8089/v1 ...
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, dims: int = 1536, latency_ms: float = 50.0,
+                 per_item_ms: float = 0.2, error_rate: float = 0.0, token_ms: float = 20.0,
+                 answer: str = "The sources say the answer is forty two [1].") -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.dims = dims
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.error_rate = error_rate
+        self.token_ms = token_ms
+        self.answer = answer
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.max_batch = 0
+        self._lock = threading.Lock()
+        # Serialising fresh random vectors would make the fake the bottleneck.
+        pool = np.random.default_rng(0).normal(size=(1024, dims))
+        pool /= np.linalg.norm(pool, axis=1, keepdims=True)
+        self._pool = [json.dumps(row) for row in np.round(pool, 6).tolist()]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def process_request(self, request, client_address) -> None:
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def inject_error(self) -> int | None:
+        if random.random() >= self.error_rate:
+            return None
+        with self._lock:
+            self.errors += 1
+        return random.choice([429, 500, 503])
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def vector_json(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return self._pool[int.from_bytes(digest[:4], "big") % len(self._pool)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; Nagle would delay the body.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: dict | str, headers: dict | None = None) -> None:
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+            return
+        if not self.path.endswith("/embeddings"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            server.max_batch = max(server.max_batch, len(inputs))
+        time.sleep((server.latency_ms + server.per_item_ms * len(inputs)) / 1000)
+        status = server.inject_error()
+        if status:
+            self._send(status, {"error": {"message": "injected failure"}}, {"retry-after": "0.05"})
+            return
+        data = ",".join(
+            f'{{"object":"embedding","index":{idx},"embedding":{server.vector_json(text)}}}'
+            for idx, text in enumerate(inputs)
+        )
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        usage = json.dumps({"prompt_tokens": tokens, "total_tokens": tokens})
+        model = json.dumps(body.get("model", "fake"))
+        self._send(200, f'{{"object":"list","data":[{data}],"model":{model},"usage":{usage}}}')
+
+    def _chat(self, body: dict) -> None:
+        server = self.server
+        with server._lock:
+            server.requests += 1
+        time.sleep(server.latency_ms / 1000)
+        status = server.inject_error()
+        if status:
+            self._send(status, {"error": {"message": "injected failure"}}, {"retry-after": "0.05"})
+            return
+        words = server.answer.split(" ")
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": server.answer}
+            choice = {"index": 0, "message": message, "finish_reason": "stop"}
+            self._send(200, {**base, "object": "chat.completion", "choices": [choice]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for idx, word in enumerate(words):
+            delta = {"content": word if idx == 0 else " " + word}
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(server.token_ms / 1000)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.port, args.dims, args.latency_ms, error_rate=args.error_rate)
+    print(f"Serving fake embeddings on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,119 @@
+"""Local documentation site with a sitemap index, for crawling offline.
+
+Serves /page/<n>.html for n < pages, /sitemap.xml (a sitemap index) and
+/sitemap-<k>.xml, with a configurable latency. Tracks the peak number of
+concurrent requests so per-host limits can be checked:
+
+    python -m benchmarks.fake_site --port 8090 --pages 5000 --latency-ms 40
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+URLS_PER_SITEMAP = 1000
+
+
+class FakeSite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, pages: int = 200, latency_ms: float = 20.0,
+                 paragraphs: int = 8) -> None:
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.pages = pages
+        self.latency_ms = latency_ms
+        self.paragraphs = paragraphs
+        self.requests = 0
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def sitemap_url(self) -> str:
+        return f"{self.base_url}/sitemap.xml"
+
+    def start(self) -> "FakeSite":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def page_html(self, number: int) -> str:
+        nav = "".join(f'<li><a href="/page/{n}.html">Page {n}</a></li>' for n in range(20))
+        body = "".join(
+            f"<h2>Section {number}.{idx}</h2><p>Page {number} paragraph {idx} explains how "
+            f"component {number * 31 + idx} handles request routing, caching and retries. "
+            + "Configuration values are read at startup and validated. " * 6 + "</p>"
+            for idx in range(self.paragraphs)
+        )
+        return (
+            f"<html><head><title>Page {number}</title><style>body{{margin:0}}</style>"
+            f"<script>var page = {number};</script></head><body><nav><ul>{nav}</ul></nav>"
+            f"<main><article><h1>Page {number}</h1>{body}</article></main>"
+            f"<footer>Copyright Example Docs. All rights reserved.</footer></body></html>"
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeSite
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            server.active += 1
+            server.peak_active = max(server.peak_active, server.active)
+        try:
+            time.sleep(server.latency_ms / 1000)
+            self._route()
+        finally:
+            with server._lock:
+                server.active -= 1
+
+    def _route(self) -> None:
+        server = self.server
+        if self.path == "/sitemap.xml":
+            count = (server.pages + URLS_PER_SITEMAP - 1) // URLS_PER_SITEMAP
+            entries = "".join(
+                f"<sitemap><loc>{server.base_url}/sitemap-{k}.xml</loc></sitemap>" for k in range(count)
+            )
+            self._send(f'<sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>', "application/xml")
+        elif self.path.startswith("/sitemap-"):
+            k = int(self.path[len("/sitemap-") : -len(".xml")])
+            numbers = range(k * URLS_PER_SITEMAP, min((k + 1) * URLS_PER_SITEMAP, server.pages))
+            entries = "".join(f"<url><loc>{server.base_url}/page/{n}.html</loc></url>" for n in numbers)
+            self._send(f'<urlset xmlns="{SITEMAP_NS}">{entries}</urlset>', "application/xml")
+        elif self.path.startswith("/page/"):
+            number = int(self.path[len("/page/") : -len(".html")])
+            if number >= server.pages:
+                self._send("not found", "text/plain", 404)
+            else:
+                self._send(server.page_html(number), "text/html; charset=utf-8")
+        else:
+            self._send("not found", "text/plain", 404)
+
+    def _send(self, body: str, content_type: str, status: int = 200) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", f'"{hash(body) & 0xFFFFFFFF:x}"')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    site = FakeSite(args.port, args.pages, args.latency_ms)
+    print(f"Serving {args.pages} pages, sitemap at {site.sitemap_url}")
+    site.serve_forever()
@@ -0,0 +1,66 @@
+"""HTML text extraction pages/sec and chunk counts: BeautifulSoup vs lxml.
+
+Compares the previous html.parser extraction with lxml on the whole page and
+lxml main-content mode. Uses a directory of saved .html pages, or generated
+documentation pages (benchmarks/fake_site.py) when no corpus is given.
+Run from backend/: python -m benchmarks.html_extraction --corpus ~/saved-pages
+"""
+import argparse
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from app.services.html_text import extract_text
+from app.services.ingestion import build_chunks
+from benchmarks.fake_site import FakeSite
+
+
+def soup_text(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    return soup.get_text(" ", strip=True)
+
+
+def load_corpus(corpus: str | None, pages: int) -> list[str]:
+    if corpus:
+        paths = sorted(Path(corpus).expanduser().glob("**/*.htm*"))[:pages]
+        return [path.read_text(encoding="utf-8", errors="replace") for path in paths]
+    site = FakeSite()
+    site.server_close()
+    html = []
+    for number in range(pages):
+        # Mix short pages with long reference pages.
+        site.paragraphs = (4, 8, 16, 64)[number % 4]
+        html.append(site.page_html(number))
+    return html
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", help="directory of saved .html pages")
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.pages)
+    megabytes = sum(len(html) for html in corpus) / 1e6
+    print(f"{len(corpus)} pages, {megabytes:.1f} MB")
+    for name, extract in (
+        ("bs4 html.parser", soup_text),
+        ("lxml full page", lambda html: extract_text(html, main_content=False)),
+        ("lxml main content", lambda html: extract_text(html, main_content=True)),
+    ):
+        started = time.perf_counter()
+        texts = [extract(html) for html in corpus]
+        elapsed = time.perf_counter() - started
+        chunks = sum(len(build_chunks([(1, text)])) for text in texts)
+        chars = sum(len(text) for text in texts)
+        print(
+            f"{name:<18} {len(corpus) / elapsed:8.1f} pages/s  "
+            f"{chars / len(corpus):8.0f} chars/page  {chunks:6d} chunks"
+        )
+
+
+if __name__ == "__main__":
+    main()
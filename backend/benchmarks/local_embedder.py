@@ -0,0 +1,59 @@
+"""Local embedder throughput and retrieval quality against the per-text hash loop.
+
+Run from backend/: python -m benchmarks.local_embedder --chunks 5000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.embeddings import LegacyHashEmbeddingProvider
+from app.services.local_embeddings import HashingEmbedder
+
+
+def synthetic_chunks(count: int, words: int, vocab_size: int, seed: int) -> list[str]:
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    vocab = ["".join(rng.choice(letters, size=rng.integers(3, 10))) for _ in range(vocab_size)]
+    # Zipf-like draw so chunks share common words, as real text does.
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    return [" ".join(rng.choice(vocab, size=words, p=weights)) + "." for _ in range(count)]
+
+
+def recall_at_1(embed, chunks: list[str], queries: list[tuple[int, str]]) -> float:
+    matrix = np.asarray(embed(chunks), dtype=np.float32)
+    query_matrix = np.asarray(embed([text for _, text in queries]), dtype=np.float32)
+    best = np.argmax(query_matrix @ matrix.T, axis=1)
+    return float(np.mean([best[i] == target for i, (target, _) in enumerate(queries)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=130)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, default=512)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, args.words, args.vocab, seed=0)
+    rng = np.random.default_rng(1)
+    queries = []
+    for target in rng.choice(len(chunks), size=args.queries, replace=False):
+        words = chunks[target].split()
+        start = rng.integers(0, len(words) - 8)
+        queries.append((int(target), " ".join(words[start : start + 8])))
+
+    legacy = LegacyHashEmbeddingProvider()
+    hashing = HashingEmbedder(args.dims)
+    for name, embed in (("per-text hash loop", legacy.embed), ("batched hashing", hashing.embed_matrix)):
+        started = time.perf_counter()
+        embed(chunks)
+        elapsed = time.perf_counter() - started
+        recall = recall_at_1(embed, chunks, queries)
+        print(f"{name:<20} {len(chunks) / elapsed:10.1f} chunks/s  recall@1={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Shared pooled OpenAI clients vs a new client per call, and circuit breaking.
+
+Times chat completions against a local fake server with a client built per
+call (as the code did before) and with the shared client, then reports how
+many TCP connections each opened. Finally the server fails every request:
+answers fall back to the extractive answer, the circuit opens after
+OPENAI_BREAKER_FAILURES failed attempts and later calls fail fast without a
+request, until the circuit closes again once the server recovers.
+Run from backend/: python -m benchmarks.openai_clients --calls 200
+"""
+import argparse
+import statistics
+import time
+from typing import Callable
+
+from openai import OpenAI
+
+from app.config import settings
+from app.services.openai_clients import chat_breaker, client_stats, openai_client
+from app.services.rag import AnswerContext, generate_answer
+from benchmarks.fake_openai import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "What is the answer?"}]
+
+
+def per_call(call: Callable[[], object], calls: int) -> float:
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def fresh_client_call() -> None:
+    with OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url, max_retries=0) as client:
+        client.chat.completions.create(model=settings.openai_model, messages=MESSAGES)
+
+
+def shared_client_call() -> None:
+    openai_client().chat.completions.create(model=settings.openai_model, messages=MESSAGES)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--outage-calls", type=int, default=20)
+    parser.add_argument("--reset-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(dims=8, latency_ms=args.latency_ms).start()
+    settings.openai_api_key = "benchmark"
+    settings.openai_base_url = server.base_url
+
+    for name, call in (("client per call", fresh_client_call), ("shared client", shared_client_call)):
+        connections = server.connections
+        median = per_call(call, args.calls)
+        print(
+            f"{name:<16} median {median * 1000:7.2f} ms/call  "
+            f"connections={server.connections - connections} for {args.calls} calls"
+        )
+    print(f"shared client connections: {client_stats()['connections']}")
+
+    chat_breaker.reset_seconds = args.reset_seconds
+    context = AnswerContext(
+        question="What is the answer?", prompt="-", prompt_chunks=[(0, "The answer is forty two.")]
+    )
+    server.error_rate = 1.0
+    requests = server.requests
+    timings = []
+    for _ in range(args.outage_calls):
+        started = time.perf_counter()
+        generate_answer(context)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"outage: {args.outage_calls} answers, all degraded={context.degraded}, "
+        f"first {timings[0] * 1000:.1f} ms, last {timings[-1] * 1000:.3f} ms, "
+        f"requests sent={server.requests - requests}, circuit={chat_breaker.stats()}"
+    )
+
+    server.error_rate = 0.0
+    time.sleep(args.reset_seconds)
+    context.degraded = False
+    generate_answer(context)
+    print(f"recovered: degraded={context.degraded}, circuit={chat_breaker.stats()['state']}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
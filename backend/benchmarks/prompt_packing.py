@@ -0,0 +1,62 @@
+"""Prompt tokens for TOP_K retrieved chunks: plain concatenation vs merged and packed.
+
+Retrieval often returns runs of neighbouring chunks from the same page, which
+repeat CHUNK_OVERLAP characters each. Each query here samples TOP_K chunks in
+runs of --run-length consecutive chunks from a generated document.
+Run from backend/: python -m benchmarks.prompt_packing --run-length 1 2 4
+"""
+import argparse
+import random
+
+from app.models import Document, DocumentChunk
+from app.services.ingestion import build_chunks
+from app.services.prompt_builder import merge_chunks, pack_sources
+from app.services.rag import TOP_K, _format_prompt
+from app.services.tokens import count_tokens
+
+
+def document_chunks(pages: int) -> list[DocumentChunk]:
+    rng = random.Random(0)
+    words = "cache index retrieval latency embedding worker queue budget token page".split()
+    texts = [(page, " ".join(rng.choice(words) for _ in range(1500))) for page in range(1, pages + 1)]
+    return [
+        DocumentChunk(id=idx + 1, content=chunk["content"], page_number=chunk["page_number"])
+        for idx, chunk in enumerate(build_chunks(texts))
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--run-length", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--budget", type=int, nargs="+", default=[3000, 1500])
+    args = parser.parse_args()
+
+    chunks = document_chunks(args.pages)
+    document = Document(id=1, name="benchmark")
+    rng = random.Random(1)
+    for run_length in args.run_length:
+        selected = []
+        for _ in range(args.queries):
+            hits = []
+            while len(hits) < TOP_K:
+                start = rng.randrange(len(chunks) - run_length)
+                hits.extend(chunks[start : start + run_length])
+            selected.append([(chunk, document, 1.0 - idx / 100) for idx, chunk in enumerate(hits[:TOP_K])])
+        plain = sum(
+            count_tokens(_format_prompt("question", [(idx, item[0].content) for idx, item in enumerate(items)]))
+            for items in selected
+        ) / args.queries
+        line = f"run={run_length:<2} plain {plain:7.0f} tokens"
+        for budget in args.budget:
+            packed = 0
+            for items in selected:
+                sources = pack_sources(merge_chunks(items), budget)
+                packed += count_tokens(_format_prompt("question", [(idx, s.content) for idx, s in enumerate(sources)]))
+            line += f"  budget={budget} {packed / args.queries:7.0f} tokens"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Ingestion and retrieval hot paths, stage by stage and end to end.
+
+Generates a synthetic corpus of --documents x --pages pages and, for each
+--chunk-tokens target, times chunking, embedding (the offline hashing
+embedder, caches off), in-memory vector search, and then against
+DATABASE_URL (e.g. the compose Postgres; rolled back afterwards) chunk
+writes, ingestion end to end, indexed retrieval and answering with the
+extractive fallback. Database stages are skipped when it is unreachable.
+
+Results can be written as JSON and compared with an earlier run; the exit
+status is 1 when a stage got slower than --tolerance allows:
+
+    python -m benchmarks.suite --output benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+
+Run from backend/: python -m benchmarks.suite --documents 20 --pages 50
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from itertools import islice
+from typing import Callable, List, Tuple
+
+import numpy as np
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.db import Base, SessionLocal, engine
+from app.migrations import upgrade_schema
+from app.models import Document, Project, User
+from app.services import chunker
+from app.services.chunk_writer import write_chunks
+from app.services.embeddings import embed_texts
+from app.services.index_cache import bump_index_version, get_project_index
+from app.services.ingestion import embed_chunks, iter_chunks
+from app.services.rag import TOP_K, generate_answer, prepare_answer
+from app.services.retrieval import search_chunks
+from app.services.tokens import CHARS_PER_TOKEN
+from app.services.vector_store import search
+
+WORDS = (
+    "retrieval index embedding chunk latency throughput worker queue cache budget token page "
+    "document project citation answer source vector cosine similarity batch stream refresh"
+).split()
+
+
+def generate_pages(documents: int, pages: int, seed: int = 0) -> List[List[Tuple[int, str]]]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(documents):
+        document = []
+        for page_number in range(1, pages + 1):
+            blocks = []
+            for _ in range(rng.randint(3, 7)):
+                if rng.random() < 0.25:
+                    blocks.append(f"## Section {page_number}.{len(blocks)}")
+                blocks.append(
+                    " ".join(
+                        " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+                        for _ in range(rng.randint(1, 5))
+                    )
+                )
+            document.append((page_number, "\n\n".join(blocks)))
+        corpus.append(document)
+    return corpus
+
+
+def questions(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(6)) + "?" for _ in range(count)]
+
+
+def result(seconds: float, items: int) -> dict:
+    return {"seconds": seconds, "items": items, "per_second": items / seconds if seconds else 0.0}
+
+
+def timed(run: Callable[[], int], repeats: int) -> dict:
+    run()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        items = run()
+        timings.append(time.perf_counter() - started)
+    return result(statistics.median(timings), items)
+
+
+def chunk_corpus(corpus) -> List[List[dict]]:
+    return [list(iter_chunks(document)) for document in corpus]
+
+
+def cpu_stages(corpus, queries: List[str], repeats: int) -> Tuple[dict, List[List[dict]]]:
+    results = {"chunk": timed(lambda: sum(map(len, chunk_corpus(corpus))), repeats)}
+    chunks = chunk_corpus(corpus)
+    texts = [chunk["content"] for document in chunks for chunk in document]
+    results["embed"] = timed(lambda: len(embed_texts(texts, use_cache=False)), repeats)
+    matrix = np.asarray(embed_texts(texts, use_cache=False), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query_vectors = embed_texts(queries, use_cache=False)
+
+    def run_search() -> int:
+        for query in query_vectors:
+            search(matrix, query, TOP_K)
+        return len(query_vectors)
+
+    results["search"] = timed(run_search, repeats)
+    return results, [embed_chunks(document) for document in chunks]
+
+
+def ingest(db, project_id: int, document_id: int, pages) -> int:
+    # Same batching as ingest_document, without its commits.
+    chunks = iter_chunks(pages)
+    count = 0
+    while batch := list(islice(chunks, settings.ingestion_batch_size)):
+        write_chunks(db, project_id, document_id, embed_chunks(batch))
+        count += len(batch)
+    return count
+
+
+def median_stages(runs: List[dict]) -> dict:
+    return {
+        name: result(statistics.median(run[name]["seconds"] for run in runs), runs[0][name]["items"])
+        for name in runs[0]
+    }
+
+
+# Each call writes into fresh projects and rolls back, so repeats start from
+# the same tables.
+def db_stages(corpus, embedded: List[List[dict]], queries: List[str]) -> dict:
+    results = {}
+    with SessionLocal() as db:
+        user = User(email="benchmark@example.com", password_hash="-")
+        db.add(user)
+        db.flush()
+        projects = [Project(user_id=user.id, name=f"benchmark {idx}") for idx in range(2)]
+        db.add_all(projects)
+        db.flush()
+
+        def add_documents(project: Project) -> List[Document]:
+            documents = [
+                Document(project_id=project.id, name=f"doc {idx}", doc_type="text") for idx in range(len(corpus))
+            ]
+            db.add_all(documents)
+            db.flush()
+            return documents
+
+        documents = add_documents(projects[0])
+        started = time.perf_counter()
+        for document, chunks in zip(documents, embedded):
+            write_chunks(db, projects[0].id, document.id, chunks)
+        db.flush()
+        results["persist"] = result(time.perf_counter() - started, sum(map(len, embedded)))
+
+        documents = add_documents(projects[1])
+        started = time.perf_counter()
+        count = sum(ingest(db, projects[1].id, document.id, pages) for document, pages in zip(documents, corpus))
+        db.flush()
+        results["ingest"] = result(time.perf_counter() - started, count)
+
+        project = projects[0]
+        bump_index_version(db, project.id)
+        db.refresh(project)
+        started = time.perf_counter()
+        get_project_index(db, project)
+        results["index_build"] = result(time.perf_counter() - started, sum(map(len, embedded)))
+
+        query_vectors = embed_texts(queries, use_cache=False)
+        started = time.perf_counter()
+        for question, query in zip(queries, query_vectors):
+            search_chunks(db, project, question, query, TOP_K, "dense")
+        results["retrieve"] = result(time.perf_counter() - started, len(queries))
+
+        started = time.perf_counter()
+        for question in queries:
+            context, _ = prepare_answer(db, project, question, "dense")
+            generate_answer(context)
+        results["answer"] = result(time.perf_counter() - started, len(queries))
+        db.rollback()
+    return results
+
+
+def unit(stage: str) -> str:
+    return "queries" if stage in ("search", "retrieve", "answer") else "chunks"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, stage in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get("per_second"):
+            continue
+        ratio = stage["per_second"] / previous["per_second"]
+        flag = "REGRESSION" if ratio < 1 - tolerance else ""
+        print(f"  {name:<22} {ratio:6.2f}x baseline {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[chunker.CHUNK_TOKENS])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3, help="runs per stage; the median is kept")
+    parser.add_argument("--no-db", action="store_true", help="skip the stages that need DATABASE_URL")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+
+    # Offline and uncached, so every run measures the same work.
+    settings.openai_api_key = None
+    settings.embedding_provider = "local"
+    settings.answer_cache_enabled = False
+    settings.embedding_cache_enabled = False
+
+    corpus = generate_pages(args.documents, args.pages)
+    queries = questions(args.queries)
+    results = {}
+    for tokens in args.chunk_tokens:
+        chunker.CHUNK_SIZE = tokens * CHARS_PER_TOKEN
+        stages, embedded = cpu_stages(corpus, queries, args.repeats)
+        if not args.no_db:
+            try:
+                Base.metadata.create_all(bind=engine)
+                upgrade_schema(engine)
+                runs = [db_stages(corpus, embedded, queries) for _ in range(args.repeats)]
+                stages.update(median_stages(runs))
+            except OperationalError as exc:
+                print(f"database stages skipped: {exc.orig}", file=sys.stderr)
+        for name, stage in stages.items():
+            results[f"{name}[{tokens}]"] = stage
+            print(
+                f"{name:<12} tokens={tokens:<4} {stage['per_second']:10.1f} {unit(name)}/s"
+                f"  {stage['seconds'] * 1000:9.1f} ms"
+            )
+
+    report = {
+        "config": {
+            "documents": args.documents,
+            "pages": args.pages,
+            "chunk_tokens": args.chunk_tokens,
+            "queries": args.queries,
+            "embedding_dims": settings.local_embedding_dims,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline.get("config") != report["config"]:
+            print("warning: baseline was recorded with a different configuration", file=sys.stderr)
+        print(f"compared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
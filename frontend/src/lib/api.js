@@ -30,3 +30,13 @@ export const apiFetchRaw = async (path, options = {}) => {
   }
   return fetch(`${API_BASE}${path}`, { ...options, headers });
 };
+
+// Paged endpoints return the cursor of the next page in X-Next-Cursor.
+export const apiFetchPage = async (path) => {
+  const response = await apiFetchRaw(path);
+  if (!response.ok) {
+    const message = await response.text();
+    throw new Error(message || "Request failed");
+  }
+  return { data: await response.json(), nextCursor: response.headers.get("X-Next-Cursor") };
+};
@@ -1,14 +1,23 @@
 import { useEffect, useState } from "react";
 import { useNavigate, useParams } from "react-router-dom";
-import { apiFetch, apiFetchRaw } from "../lib/api.js";
+import { apiFetch, apiFetchPage, apiFetchRaw } from "../lib/api.js";
 import { streamChat } from "../lib/stream.js";
 
+const formatMessages = (data) =>
+  data.map((msg) => ({
+    role: msg.role,
+    content: msg.content,
+    citations: msg.sources_json || [],
+  }));
+
 export default function ProjectWorkspace() {
   const { projectId } = useParams();
   const navigate = useNavigate();
   const [project, setProject] = useState(null);
   const [documents, setDocuments] = useState([]);
   const [messages, setMessages] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [question, setQuestion] = useState("");
   const [urlInput, setUrlInput] = useState("");
   const [activeCitations, setActiveCitations] = useState([]);
@@ -29,17 +38,30 @@ export default function ProjectWorkspace() {
   };
 
   const loadHistory = async () => {
-    const data = await apiFetch(`/projects/${projectId}/chat`);
-    const formatted = data.map((msg) => ({
-      role: msg.role,
-      content: msg.content,
-      citations: msg.sources_json || [],
-    }));
+    const { data, nextCursor } = await apiFetchPage(`/projects/${projectId}/chat`);
+    const formatted = formatMessages(data);
     setMessages(formatted);
+    setHistoryCursor(nextCursor);
     const lastAssistant = formatted.filter((msg) => msg.role === "assistant").pop();
     setActiveCitations(lastAssistant?.citations || []);
   };
 
+  const loadOlderHistory = async () => {
+    if (!historyCursor) return;
+    setLoadingOlder(true);
+    try {
+      const { data, nextCursor } = await apiFetchPage(
+        `/projects/${projectId}/chat?before=${encodeURIComponent(historyCursor)}`
+      );
+      setMessages((prev) => [...formatMessages(data), ...prev]);
+      setHistoryCursor(nextCursor);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   useEffect(() => {
     Promise.all([loadProject(), loadDocuments(), loadHistory()]).catch((err) =>
       setError(err.message)
@@ -200,6 +222,11 @@ export default function ProjectWorkspace() {
         <section className="panel chat-panel">
           <h2>Ask your documents</h2>
           <div className="chat-history">
+            {historyCursor && (
+              <button className="link load-older" onClick={loadOlderHistory} disabled={loadingOlder}>
+                {loadingOlder ? "Loading..." : "Load older messages"}
+              </button>
+            )}
             {messages.map((msg, idx) => (
               <div key={idx} className={`chat-bubble ${msg.role}`}>
                 <p>{msg.content}</p>